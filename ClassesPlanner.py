@@ -1,7 +1,12 @@
 import sqlite3
 import datetime
-import time, threading
-from collections import OrderedDict
+import time, threading, struct
+import heapq, itertools, bisect, queue
+import sys, os, re, weakref
+import functools, json, csv, atexit, contextlib
+from array import array
+from collections import OrderedDict, namedtuple
+import numpy
 from PySide2.QtGui import *
 from PySide2.QtCore import *
 from PySide2.QtWidgets import QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication, QMessageBox
@@ -12,6 +17,13 @@ class FilteredState:
     FilterApply = 1
 
 
+class ReportGrouping:
+    day = 0
+    week = 1  # ISO week
+    month = 2
+    taskName = 3
+
+
 class FieldType:
     getter = 1
     setter = 2
@@ -32,21 +44,245 @@ class ViewMapping:
     IGNORE = 1
 
 
+# Optional counters of database queries, filter rebuilds and model calls
+# enabled by PLANNER_METRICS=<file>.json|<file>.csv, snapshot is appended to the file every PLANNER_METRICS_INTERVAL
+# seconds (10 by default) and on exit; json file gets one object per line, csv file gets time,name,field,value rows
+class PlannerMetrics:
+    histogramLimits = (0.1, 0.5, 1, 5, 10, 50, 100, 500)  # upper limits of latency buckets in ms, last bucket is "inf"
+
+    def __init__(self, fileName, interval=10.0):
+        self.__fileName = fileName
+        self.__interval = interval
+        self.__lock = threading.Lock()
+        self.__counters = dict()  # name -> count
+        self.__timings = dict()  # name -> [count, total s, max s, histogram buckets]
+        self.__lastCounters = dict()
+        self.__lastDump = time.monotonic()
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    # metrics of environment settings or None if they are disabled
+    @classmethod
+    def fromEnvironment(cls):
+        fileName = os.environ.get("PLANNER_METRICS", "")
+        if fileName == "":
+            return None
+        return cls(fileName, float(os.environ.get("PLANNER_METRICS_INTERVAL", "10")))
+
+    @property
+    def fileName(self):
+        return self.__fileName
+
+    # count calls without lock: frequent calls from gui thread, lost increment is acceptable
+    def increment(self, name, count=1):
+        self.__counters[name] = self.__counters.get(name, 0) + count
+
+    def record(self, name, seconds):
+        with self.__lock:
+            timing = self.__timings.get(name)
+            if timing is None:
+                timing = self.__timings[name] = [0, 0.0, 0.0, [0] * (len(self.histogramLimits) + 1)]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+            timing[3][bisect.bisect_left(self.histogramLimits, seconds * 1000)] += 1
+
+    # counters with rate per second since previous snapshot and timings with latency histograms
+    def snapshot(self):
+        now = time.monotonic()
+        with self.__lock:
+            elapsed = max(now - self.__lastDump, 1e-9)
+            counters = dict(self.__counters)
+            timings = {name: (count, total, maximum, list(buckets))
+                       for name, (count, total, maximum, buckets) in self.__timings.items()}
+            lastCounters, self.__lastCounters = self.__lastCounters, counters
+            self.__lastDump = now
+        labels = [f"<={limit}ms" for limit in self.histogramLimits] + ["inf"]
+        return {"time": time.time(),
+                "interval": elapsed,
+                "counters": {name: {"count": count, "rate": (count - lastCounters.get(name, 0)) / elapsed}
+                             for name, count in sorted(counters.items())},
+                "timings": {name: {"count": count, "totalMs": total * 1000, "meanMs": total * 1000 / count,
+                                   "maxMs": maximum * 1000, "histogram": dict(zip(labels, buckets))}
+                            for name, (count, total, maximum, buckets) in sorted(timings.items())}}
+
+    def dump(self):
+        snapshot = self.snapshot()
+        with open(self.__fileName, "a", newline="") as file:
+            if self.__fileName.lower().endswith(".csv"):
+                writer = csv.writer(file)
+                if file.tell() == 0:
+                    writer.writerow(["time", "name", "field", "value"])
+                for group in ("counters", "timings"):
+                    for name, values in snapshot[group].items():
+                        for field, value in values.items():
+                            if field == "histogram":
+                                for bucket, count in value.items():
+                                    writer.writerow([snapshot["time"], name, bucket, count])
+                            else:
+                                writer.writerow([snapshot["time"], name, field, value])
+            else:
+                file.write(json.dumps(snapshot) + "\n")
+
+    # periodical dump in daemon thread and last dump on exit
+    def start(self):
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__run, name="PlannerMetrics", daemon=True)
+            self.__thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        if self.__thread is not None:
+            self.__stopped.set()
+            self.__thread.join()
+            self.__thread = None
+            self.dump()
+
+    def __run(self):
+        while not self.__stopped.wait(self.__interval):
+            self.dump()
+
+
+metrics = PlannerMetrics.fromEnvironment()
+if metrics is not None:
+    metrics.start()
+
+
+# decorators of instrumented methods, method is returned unchanged when metrics are disabled
+def timedCall(name):
+    def decorate(method):
+        if metrics is None:
+            return method
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                metrics.record(name, time.perf_counter() - start)
+        return timed
+    return decorate
+
+
+# statementType - INSERT, UPDATE, DELETE or SELECT, length of returned list is counted as rows read
+def timedQuery(statementType):
+    name = "DBConnector." + statementType
+    def decorate(method):
+        if metrics is None:
+            return method
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                metrics.record(name, time.perf_counter() - start)
+            if type(result) == list:
+                metrics.increment("DBConnector.rowsRead", len(result))
+            return result
+        return timed
+    return decorate
+
+
+def countedCall(name):
+    def decorate(method):
+        if metrics is None:
+            return method
+
+        @functools.wraps(method)
+        def counted(*args, **kwargs):
+            metrics.increment(name)
+            return method(*args, **kwargs)
+        return counted
+    return decorate
+
+
 colorBindings = ("state", QBrush(QColor(229, 229, 229)),
                  ("RUN", QBrush(Qt.green)))
 
 
+# Background brush of task rows: by value of property (state), by workTime thresholds and by age (now - dateStart)
+# rules are checked in this order, brush of row is found by dict lookup and bisect over few sorted thresholds
+class ColorRules:
+    def __init__(self, defaultBrush, propertyName="state"):
+        self.__defaultBrush = defaultBrush
+        self.__propertyName = propertyName
+        self.__valueBrushes = dict()  # property value -> brush
+        self.__workTimeLimits = []  # sorted thresholds in seconds
+        self.__workTimeBrushes = []
+        self.__ageLimits = []
+        self.__ageBrushes = []
+
+    # rules from colorBindings format: (property name, default brush, (value, brush), ...)
+    @classmethod
+    def fromBindings(cls, bindings):
+        rules = cls(bindings[1], bindings[0])
+        for binding in bindings:
+            if type(binding) is tuple:
+                rules.byValue(binding[0], binding[1])
+        return rules
+
+    def byValue(self, value, brush):
+        self.__valueBrushes[value] = brush
+        return self
+
+    # brush for tasks with workTime >= workTime
+    def byWorkTime(self, workTime, brush):
+        pos = bisect.bisect_left(self.__workTimeLimits, workTime)
+        self.__workTimeLimits.insert(pos, workTime)
+        self.__workTimeBrushes.insert(pos, brush)
+        return self
+
+    # brush for tasks added at least age seconds ago
+    def byAge(self, age, brush):
+        pos = bisect.bisect_left(self.__ageLimits, age)
+        self.__ageLimits.insert(pos, age)
+        self.__ageBrushes.insert(pos, brush)
+        return self
+
+    # task properties used by rules, brush of row is changed only with them (and time for age rules)
+    @property
+    def properties(self):
+        return (self.__propertyName, "workTime", "dateStart")
+
+    # (brush, time when brush is changed by age or None)
+    def brush(self, task, now):
+        brush = self.__valueBrushes.get(getattr(task, self.__propertyName, None))
+        if brush is not None:
+            return brush, None
+        if len(self.__workTimeLimits) > 0:
+            pos = bisect.bisect_right(self.__workTimeLimits, task.workTime)
+            if pos > 0:
+                return self.__workTimeBrushes[pos - 1], None
+        if len(self.__ageLimits) > 0:
+            dateStart = int(float(task.dateStart))
+            pos = bisect.bisect_right(self.__ageLimits, now - dateStart)
+            expires = dateStart + self.__ageLimits[pos] if pos < len(self.__ageLimits) else None
+            if pos > 0:
+                return self.__ageBrushes[pos - 1], expires
+            return self.__defaultBrush, expires
+        return self.__defaultBrush, None
+
+
+defaultColorRules = ColorRules.fromBindings(colorBindings)
+
+
 class Task:
+    __slots__ = ("__taskName", "__dateStart", "__dateEnd", "__taskID", "__workTime", "__segmentStart", "__segmentId",
+                 "__state", "__observer", "__weakref__")
+
     def __init__(self, taskName, dateStart, workTime, observer):
         self.__taskName = taskName
         self.__dateStart = dateStart
         self.__dateEnd = None
         self.__taskID = -1
-        self.__workTime = workTime
+        self.__workTime = workTime  # time of closed run segments
+        self.__segmentStart = None  # start of open run segment (task is running)
+        self.__segmentId = -1
         self.__state = "PAUSED"
-        self.__timeout = 10  # frequency refresh work time
         self.__observer = observer
-        self.__Timer = None
 
     @property
     def dateStart(self):
@@ -74,7 +310,7 @@ class Task:
     @dateEnd.setter
     def dateEnd(self, dateEnd):
         if dateEnd is not None and isinstance(dateEnd, int):
-            if dateEnd > self.__dateStart:
+            if dateEnd >= self.__dateStart:
                 self.__dateEnd = dateEnd
 
     @state.setter
@@ -87,42 +323,450 @@ class Task:
         if (self.__taskID == -1):
             self.__taskID = taskId
 
+    # closed segments + open segment, value is computed from clock
     @property
     def workTime(self):
+        if self.__segmentStart is not None:
+            return self.__workTime + int(time.time()) - self.__segmentStart
         return self.__workTime
 
+    # work time without open segment
+    @property
+    def closedWorkTime(self):
+        return self.__workTime
+
+    @property
+    def segmentStart(self):
+        return self.__segmentStart
+
     def startTask(self):
-        self.__workTime += self.__timeout
+        if self.__segmentStart is None:
+            self.__segmentStart = int(time.time())
+            self.__segmentId = self.__observer.openSegment(self, self.__segmentStart)
         if self.state != "RUN":
             self.state = "RUN"
             self.__observer.notify(self, ["state"])  # notify storage once
-        self.__observer.notify(self, ["workTime"])  # notify storage
-        self.__Timer = threading.Timer(self.__timeout, self.startTask)
-        self.__Timer.start()
+        self.__observer.scheduler.register(self)
+
+    # called by TaskScheduler every period while task is running, work time is not written to database
+    def tick(self, elapsed):
+        self.__observer.notifyView(self, ["workTime"])  # refresh view only
+
+    def __closeSegment(self):
+        if self.__segmentStart is not None:
+            segmentEnd = int(time.time())
+            self.__workTime += segmentEnd - self.__segmentStart
+            self.__observer.closeSegment(self, self.__segmentId, segmentEnd)
+            self.__segmentStart = None
+            self.__segmentId = -1
 
     def pauseTask(self):
-        if self.state == "RUN" and self.__Timer is not None and self.__Timer.is_alive():
-            self.__Timer.cancel()
+        self.__observer.scheduler.unregister(self)
+        self.__closeSegment()
         self.state = "PAUSED"
-        self.__observer.notify(self, ["state"])  # notify storage
+        self.__observer.notify(self, ["state", "workTime"])  # notify storage
 
     def stopTask(self):
-        if self.__Timer is not None and self.__Timer.is_alive():
-            self.__Timer.cancel()
+        self.__observer.scheduler.unregister(self)
+        self.__closeSegment()
         self.state = "STOP"
         self.__dateEnd = int(time.time())
-        self.__observer.notify(self, ["state", "dateEnd"])  # notify storage
+        self.__observer.notify(self, ["state", "dateEnd", "workTime"])  # notify storage
+
+
+# One worker thread ticks all running tasks
+# Tasks are kept in heap ordered by next tick time, all tasks with expired time are ticked in one batch
+class TaskScheduler:
+    def __init__(self, period=10):
+        self.__period = period  # frequency refresh work time
+        self.__heap = []  # (deadline, seq, task)
+        self.__registered = dict()  # task -> seq of actual heap entry, other entries of task are outdated
+        self.__seq = itertools.count()
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__stopped = False
+
+    @property
+    def period(self):
+        return self.__period
+
+    @property
+    def taskCount(self):
+        return len(self.__registered)
+
+    def register(self, task):
+        with self.__condition:
+            if task in self.__registered:
+                return
+            seq = next(self.__seq)
+            self.__registered[task] = seq
+            heapq.heappush(self.__heap, (time.monotonic() + self.__period, seq, task))
+            if self.__thread is None:
+                self.__stopped = False
+                self.__thread = threading.Thread(target=self.__run, name="TaskScheduler", daemon=True)
+                self.__thread.start()
+            self.__condition.notify()
+
+    def unregister(self, task):
+        with self.__condition:
+            self.__registered.pop(task, None)  # heap entry is skipped by worker
+
+    # stop worker thread, registered tasks are not ticked anymore
+    def stop(self):
+        with self.__condition:
+            self.__stopped = True
+            self.__registered.clear()
+            self.__heap.clear()
+            thread = self.__thread
+            self.__thread = None
+            self.__condition.notify()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def __run(self):
+        while True:
+            batch = []
+            with self.__condition:
+                while not self.__stopped:
+                    now = time.monotonic()
+                    while self.__heap and self.__registered.get(self.__heap[0][2]) != self.__heap[0][1]:
+                        heapq.heappop(self.__heap)  # task was unregistered
+                    if self.__heap and self.__heap[0][0] <= now:
+                        break
+                    self.__condition.wait(self.__heap[0][0] - now if self.__heap else None)
+                if self.__stopped:
+                    return
+                while self.__heap and self.__heap[0][0] <= now:
+                    deadline, seq, task = heapq.heappop(self.__heap)
+                    if self.__registered.get(task) != seq:
+                        continue
+                    batch.append(task)
+                    deadline += self.__period
+                    if deadline <= now:  # worker was late, don't tick several times in a row
+                        deadline = now + self.__period
+                    heapq.heappush(self.__heap, (deadline, seq, task))
+            for task in batch:
+                task.tick(self.__period)
+
+
+# Database requests executed by one worker thread in order of submit, so writes of one task are never reordered
+# result or error of request is passed to its callback in thread of worker object (gui thread) by queued signal
+class DBWorker(QObject):
+    completed = Signal(object, object, object)  # callback, result, error
+
+    def __init__(self):
+        super(DBWorker, self).__init__()
+        self.__queue = queue.Queue()
+        self.__thread = None
+        self.__lock = threading.Lock()
+        self.completed.connect(self.__complete, Qt.QueuedConnection)
+
+    # function(*args) is called in worker thread, callback(result, error) - in gui thread
+    def submit(self, function, args=(), callback=None):
+        with self.__lock:
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name="DBWorker", daemon=True)
+                self.__thread.start()
+        self.__queue.put((function, args, callback))
+
+    # block until all submitted requests are executed (before reading rows written by them)
+    def wait(self):
+        self.__queue.join()
+
+    # execute submitted requests and stop worker thread
+    def stop(self):
+        with self.__lock:
+            thread = self.__thread
+            self.__thread = None
+        if thread is not None:
+            self.__queue.put(None)
+            thread.join()
+
+    def __run(self):
+        while True:
+            request = self.__queue.get()
+            if request is None:
+                self.__queue.task_done()
+                return
+            function, args, callback = request
+            result = None
+            error = None
+            try:
+                try:
+                    result = function(*args)
+                except Exception as exception:
+                    error = exception
+                if callback is not None:  # completion is posted before wait() returns
+                    self.completed.emit(callback, result, error)
+            finally:
+                self.__queue.task_done()
+
+    def __complete(self, callback, result, error):
+        callback(result, error)
+
+
+# Changes marked dirty from any thread are delivered to apply(changes) in gui thread at most frameRate times per second
+# changes - dict key -> set of changed properties collected since previous delivery
+class RefreshCoalescer(QObject):
+    scheduled = Signal()
+
+    def __init__(self, apply, frameRate=30):
+        super(RefreshCoalescer, self).__init__()
+        self.__apply = apply
+        self.__interval = 1.0 / frameRate
+        self.__lock = threading.Lock()
+        self.__dirty = dict()
+        self.__pending = False  # delivery is scheduled
+        self.__lastDelivery = 0.0
+        self.__timer = QTimer(self)
+        self.__timer.setSingleShot(True)
+        self.__timer.timeout.connect(self.__deliver)
+        self.scheduled.connect(self.__schedule, Qt.QueuedConnection)
+
+    @property
+    def frameRate(self):
+        return 1.0 / self.__interval
+
+    # called from any thread, only first change of frame sends signal to gui thread
+    def markDirty(self, key, propertyes):
+        with self.__lock:
+            self.__dirty.setdefault(key, set()).update(propertyes)
+            if self.__pending:
+                return
+            self.__pending = True
+        self.scheduled.emit()
+
+    def __schedule(self):
+        delay = self.__lastDelivery + self.__interval - time.monotonic()
+        self.__timer.start(max(0, int(delay * 1000)))
+
+    def __deliver(self):
+        with self.__lock:
+            dirty = self.__dirty
+            self.__dirty = dict()
+            self.__pending = False
+        self.__lastDelivery = time.monotonic()
+        if len(dirty) > 0:
+            self.__apply(dirty)
+
+    # deliver collected changes at once (gui thread)
+    def flush(self):
+        self.__timer.stop()
+        self.__deliver()
+
+
+# Append-only file of fixed-size records (task id, timestamp, delta, kind) written by tick path of running tasks
+# tick - delta is seconds of work since previous record of task
+# checkpoint - delta is work time of task at timestamp (run segment is started or journal is compacted)
+# closed - delta is work time of task after run segment is closed at timestamp
+# checkpoints keep absolute work time, so replay gives the same result before and after compaction is written
+class TickJournal:
+    record = struct.Struct("<qqqB")
+    tick = 0
+    checkpoint = 1
+    closed = 2
+
+    # flushInterval - seconds between writes of buffered records to file (0 - every record is written at once)
+    def __init__(self, path, flushInterval=0.0):
+        self.__path = path
+        self.__flushInterval = flushInterval
+        self.__lock = threading.Lock()
+        self.__file = open(path, "ab")
+        self.__records = self.__file.tell() // self.record.size
+        self.__lastFlush = time.monotonic()
+
+    @property
+    def path(self):
+        return self.__path
+
+    # count of records in file
+    @property
+    def records(self):
+        return self.__records
+
+    # end of written records, records after position are kept by compact
+    @property
+    def position(self):
+        with self.__lock:
+            return self.__file.tell()
+
+    def append(self, taskId, timestamp, delta, kind=tick):
+        with self.__lock:
+            self.__file.write(self.record.pack(taskId, timestamp, delta, kind))
+            self.__records += 1
+            now = time.monotonic()
+            if now - self.__lastFlush >= self.__flushInterval:
+                self.__file.flush()
+                self.__lastFlush = now
+
+    # all records, incomplete record at the end (crash while writing) is skipped
+    def read(self):
+        with self.__lock:
+            self.__file.flush()
+            with open(self.__path, "rb") as file:
+                data = file.read()
+        return list(self.record.iter_unpack(data[:len(data) - len(data) % self.record.size]))
+
+    # task id -> (time of last record, work time at this time, run segment is closed)
+    def replay(self):
+        tasks = dict()
+        for taskId, timestamp, delta, kind in self.read():
+            if kind == self.tick:
+                if taskId in tasks:  # ticks without checkpoint are written before start of journal
+                    tasks[taskId] = (timestamp, tasks[taskId][1] + delta, False)
+            else:
+                tasks[taskId] = (timestamp, delta, kind == self.closed)
+        return tasks
+
+    # records before position are written to Task table: they are replaced by checkpoints
+    # (task id, timestamp, work time) of running tasks
+    def compact(self, position, checkpoints):
+        with self.__lock:
+            self.__file.flush()
+            with open(self.__path, "rb") as file:
+                file.seek(position)
+                tail = file.read()
+            tail = tail[:len(tail) - len(tail) % self.record.size]
+            with open(self.__path + ".tmp", "wb") as file:
+                for taskId, timestamp, workTime in checkpoints:
+                    file.write(self.record.pack(taskId, timestamp, workTime, self.checkpoint))
+                file.write(tail)
+                file.flush()
+                os.fsync(file.fileno())
+            self.__file.close()
+            os.replace(self.__path + ".tmp", self.__path)  # file is replaced at once, crash keeps old or new file
+            self.__file = open(self.__path, "ab")
+            self.__records = len(checkpoints) + len(tail) // self.record.size
+
+    # all records are written to database
+    def reset(self):
+        with self.__lock:
+            self.__file.truncate(0)
+            self.__file.seek(0)
+            self.__records = 0
+
+    def close(self):
+        with self.__lock:
+            self.__file.close()
+
+
+# lower case words of text as they are split by FTS5 unicode61 tokenizer
+def ftsWords(text):
+    return re.findall(r"[^\W_]+", text.lower())
+
+
+# PRAGMA settings applied to every connection opened by DBConnector
+defaultPragmas = (("journal_mode", "WAL"),
+                  ("synchronous", "NORMAL"),
+                  ("cache_size", -8000),  # negative value is size in KiB
+                  ("mmap_size", 67108864))
+
+
+# OrmSettings tuple compiled once: property <-> column dicts and parameterized statements of table
+# statements for all columns are built here, for other column lists on first use
+class OrmMapping:
+    def __init__(self, mapping, tableName=None):
+        if isinstance(mapping, OrmMapping):
+            mapping = mapping.settings
+        self.__settings = tuple(mapping) if mapping is not None else ()
+        self.__tableName = tableName
+        self.__columns = dict((obj.objectPropertyName, obj.dbFieldName) for obj in self.__settings)
+        self.__properties = dict((obj.dbFieldName, obj.objectPropertyName) for obj in self.__settings)
+        # (property, column) of fields which are set on task created from database row
+        self.__setters = tuple((obj.objectPropertyName, obj.dbFieldName) for obj in self.__settings
+                               if obj.objectPropertyType == FieldType.setter or obj.objectPropertyType == FieldType.all)
+        self.__primary = None
+        for obj in self.__settings:
+            if dbTypeField.PKEY in obj.dbFieldType:  # Primary Key field name
+                self.__primary = obj
+        self.__keyColumn = self.__primary.dbFieldName if self.__primary is not None else "id"
+        self.__statements = dict()
+        if tableName is not None and len(self.__settings) > 0:
+            columns = [obj.dbFieldName for obj in self.__settings]
+            valueColumns = [column for column in columns if column != self.__keyColumn]
+            self.insertStatement(valueColumns)
+            self.updateStatement(valueColumns)
+            self.selectStatement(columns)
+            self.deleteStatement()
+
+    def __iter__(self):
+        return iter(self.__settings)
+
+    def __len__(self):
+        return len(self.__settings)
+
+    @property
+    def settings(self):
+        return self.__settings
+
+    @property
+    def primary(self):
+        return self.__primary
+
+    @property
+    def keyColumn(self):
+        return self.__keyColumn
+
+    @property
+    def setters(self):
+        return self.__setters
+
+    # database column of task property, None if property is not mapped
+    def column(self, propertyName):
+        return self.__columns.get(propertyName)
+
+    def property(self, dbFieldName):
+        return self.__properties.get(dbFieldName)
+
+    def __statement(self, key, build):
+        statement = self.__statements.get(key)
+        if statement is None:
+            statement = build()
+            self.__statements[key] = statement
+        return statement
+
+    def insertStatement(self, columns):
+        return self.__statement(("INSERT", tuple(columns)), lambda: f"INSERT INTO {self.__tableName} "
+                                f"({', '.join(columns)}) VALUES({', '.join('?' for column in columns)})")
+
+    # UPDATE of columns for row with key value (last parameter)
+    # condition - WHERE clause instead of key, statements with condition are not cached
+    def updateStatement(self, columns, condition=None):
+        if condition is not None:
+            sqlQuery = f"UPDATE {self.__tableName} SET {', '.join(f'{column}=?' for column in columns)}"
+            return sqlQuery + f" WHERE {condition}" if condition != "" else sqlQuery
+        return self.__statement(("UPDATE", tuple(columns)), lambda: f"UPDATE {self.__tableName} SET "
+                                f"{', '.join(f'{column}=?' for column in columns)} WHERE {self.__keyColumn}=?")
+
+    # SELECT of columns without WHERE clause
+    def selectStatement(self, columns):
+        return self.__statement(("SELECT", tuple(columns)),
+                                lambda: f"SELECT {', '.join(columns)} FROM {self.__tableName}")
+
+    # DELETE of rows with value of column (key column if None)
+    def deleteStatement(self, column=None):
+        column = column if column is not None else self.__keyColumn
+        return self.__statement(("DELETE", column), lambda: f"DELETE FROM {self.__tableName} WHERE {column}=?")
 
 
 class DBConnector:
-    def __init__(self, dbPath, tableName, mapping):
+    # indexFields - columns with SQLite index (f.e. DateEnd for date range queries)
+    # ftsFields - columns with FTS5 full-text index (table {tableName}_fts), index is kept in sync by triggers
+    def __init__(self, dbPath, tableName, mapping, pragmas=defaultPragmas, persistent=True, indexFields=(),
+                 ftsFields=()):
         # For create database and table in database
         self.__dbPath = dbPath
         self.__tableName = tableName
-        self.__mapping = mapping
-        conn = sqlite3.connect(self.__dbPath)
+        self.__mapping = OrmMapping(mapping, tableName)
+        self.__pragmas = pragmas
+        self.__persistent = persistent  # False - open and close connection for every query
+        self.__local = threading.local()  # one connection per thread (timer threads use their own)
+        self.__connections = []
+        self.__lock = threading.Lock()
+        self.__columns = None  # columns of table, read on first select
+        conn = self.__connect()
         createFields = ""
-        if self.__mapping is not None:
+        if len(self.__mapping) > 0:
             for element in self.__mapping:
                 columnType = ""
                 for colType in element.dbFieldType:
@@ -133,73 +777,390 @@ class DBConnector:
         createQuery = f"CREATE TABLE IF NOT EXISTS {self.__tableName}({createFields});"
         c = conn.cursor()
         c.execute(createQuery)
+        for field in indexFields:
+            c.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.__tableName}_{field} ON {self.__tableName}({field});")
+        self.__ftsTable = None
+        if len(ftsFields) > 0:
+            self.__createFts(c, ftsFields)
         conn.commit()
-        conn.close()
+        self.__release(conn)
+
+    # external content FTS5 table: only index is stored, rows of table are indexed on insert/delete/update
+    def __createFts(self, c, ftsFields):
+        fts = self.__ftsTable = f"{self.__tableName}_fts"
+        key = self.__mapping.keyColumn
+        fields = ", ".join(ftsFields)
+        oldValues = ", ".join(f"old.{field}" for field in ftsFields)
+        newValues = ", ".join(f"new.{field}" for field in ftsFields)
+        exists = c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (fts,)).fetchone()
+        c.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({fields}, content='{self.__tableName}', "
+                  f"content_rowid='{key}');")
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {self.__tableName} BEGIN "
+                  f"INSERT INTO {fts}(rowid, {fields}) VALUES (new.{key}, {newValues}); END;")
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {self.__tableName} BEGIN "
+                  f"INSERT INTO {fts}({fts}, rowid, {fields}) VALUES ('delete', old.{key}, {oldValues}); END;")
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {fields} ON {self.__tableName} BEGIN "
+                  f"INSERT INTO {fts}({fts}, rowid, {fields}) VALUES ('delete', old.{key}, {oldValues}); "
+                  f"INSERT INTO {fts}(rowid, {fields}) VALUES (new.{key}, {newValues}); END;")
+        if exists is None:  # database created before full-text index: index existing rows
+            c.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild');")
+
+    # FTS5 query for text typed by user: words are whole words of indexed fields, last word (being typed) is prefix
+    # words are split like by FTS5 tokenizer (letters and digits), f.e. 'repo, ana' -> '"repo" AND "ana"*'
+    # prefix query of frequent word reads all its rows, so only last word is prefix
+    # None if text has no words
+    @staticmethod
+    def prefixQuery(text):
+        words = ftsWords(text)
+        if len(words) == 0:
+            return None
+        return " AND ".join([f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*'])
+
+    # ids of rows matching FTS5 query, ordered by id
+    @timedQuery("SELECT")
+    def matchIds(self, query):
+        if self.__ftsTable is None:
+            raise ValueError("Table has no full-text index")
+        conn = self.__connect()
+        ids = [row[0] for row in conn.execute(f"SELECT rowid FROM {self.__ftsTable} WHERE {self.__ftsTable} "
+                                              f"MATCH ? ORDER BY rowid", (query,))]
+        self.__release(conn)
+        return ids
+
+    # (condition, params) for rows matching FTS5 query (for getPage, getAggregate)
+    def matchCondition(self, query):
+        if self.__ftsTable is None:
+            raise ValueError("Table has no full-text index")
+        return f"{self.__mapping.keyColumn} IN (SELECT rowid FROM {self.__ftsTable} " \
+               f"WHERE {self.__ftsTable} MATCH ?)", [query]
+
+    # get connection for current thread, connection is created with PRAGMA settings on first call
+    def __connect(self):
+        conn = getattr(self.__local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.__dbPath, timeout=10, check_same_thread=False)  # closed from close()
+            if self.__pragmas is not None:
+                for pragma, value in self.__pragmas:
+                    conn.execute(f"PRAGMA {pragma}={value}")
+            self.__local.conn = conn
+            with self.__lock:
+                self.__connections.append(conn)
+        return conn
+
+    def __release(self, conn):
+        if not self.__persistent and getattr(self.__local, "depth", 0) == 0:
+            self.__local.conn = None
+            with self.__lock:
+                self.__connections.remove(conn)
+            conn.close()
 
+    # statements of write methods are committed by transaction which uses connection
+    def __commit(self, conn):
+        if getattr(self.__local, "depth", 0) == 0:
+            conn.commit()
+
+    # write methods of this and other connectors called in block are executed in current thread by one connection
+    # of this connector and committed together (rolled back on error), database files of other connectors are
+    # attached (names of tables must differ), f.e. with taskConnector.transaction(segmentConnector): delete rows of
+    # task and its segments
+    # WARN: commit of attached files in WAL mode is atomic only within each file
+    @contextlib.contextmanager
+    def transaction(self, *connectors):
+        connectors = [self] + [connector for connector in connectors if connector is not None and connector is not self]
+        conn = self.__connect()
+        outer = getattr(self.__local, "depth", 0) == 0
+        if outer:  # database can't be attached inside transaction
+            for connector in connectors[1:]:
+                self.__targetTable(conn, connector)
+        saved = [connector.__join(conn) for connector in connectors]
+        try:
+            yield
+            if outer:
+                conn.commit()
+        except BaseException:
+            if outer:
+                conn.rollback()
+            raise
+        finally:
+            for connector, state in zip(connectors, saved):
+                connector.__leave(state)
+            self.__release(conn)
+
+    # connection of transaction is used by connector in current thread
+    def __join(self, conn):
+        state = (getattr(self.__local, "conn", None), getattr(self.__local, "depth", 0))
+        self.__local.conn = conn
+        self.__local.depth = state[1] + 1
+        return state
+
+    def __leave(self, state):
+        self.__local.conn, self.__local.depth = state
+
+    # close all opened connections (call on application exit)
+    def close(self):
+        with self.__lock:
+            connections = self.__connections
+            self.__connections = []
+        for conn in connections:
+            conn.close()
+        self.__local = threading.local()
+
+    @property
+    def ormMapping(self):
+        return self.__mapping
+
+    @property
+    def dbPath(self):
+        return self.__dbPath
+
+    @property
+    def tableName(self):
+        return self.__tableName
+
+    # table of target connector for statements of conn, database file of target is attached if it is not opened by conn
+    def __targetTable(self, conn, target):
+        path = os.path.abspath(target.dbPath)
+        for row in conn.execute("PRAGMA database_list"):
+            if row[2] != "" and os.path.abspath(row[2]) == path:
+                return target.tableName if row[1] == "main" else f"{row[1]}.{target.tableName}"
+        schema = f"{target.tableName}_db"
+        conn.execute(f"ATTACH DATABASE ? AS {schema}", (target.dbPath,))
+        return f"{schema}.{target.tableName}"
+
+    # move rows matching the condition to table of target connector (same columns) in one transaction
+    # return count of moved rows
+    @timedQuery("INSERT")
+    def moveTo(self, target, condition):
+        conn = self.__connect()
+        table = self.__targetTable(conn, target)
+        columns = ", ".join(obj.dbFieldName for obj in self.__mapping)
+        key = self.__mapping.keyColumn
+        # crash between commits of attached files leaves row in both tables: row of this table replaces it
+        # (DELETE instead of INSERT OR REPLACE, delete triggers of full-text index are fired)
+        conn.execute(f"DELETE FROM {table} WHERE {key} IN (SELECT {key} FROM {self.__tableName} WHERE {condition})")
+        conn.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {self.__tableName} WHERE {condition}")
+        moved = conn.execute(f"DELETE FROM {self.__tableName} WHERE {condition}").rowcount
+        self.__commit(conn)
+        self.__release(conn)
+        return moved
+
+    # move rows with primary key values ids to table of target connector in one transaction
+    @timedQuery("INSERT")
+    def moveManyById(self, target, ids):
+        if len(ids) == 0:
+            return
+        conn = self.__connect()
+        table = self.__targetTable(conn, target)
+        columns = ", ".join(obj.dbFieldName for obj in self.__mapping)
+        params = [(id,) for id in ids]
+        conn.executemany(f"DELETE FROM {table} WHERE {self.__mapping.keyColumn}=?", params)  # row left by crash
+        conn.executemany(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {self.__tableName} "
+                         f"WHERE {self.__mapping.keyColumn}=?", params)
+        conn.executemany(self.__mapping.deleteStatement(), params)
+        self.__commit(conn)
+        self.__release(conn)
+
+    # delete rows with primary key values which are in table of source connector, return count of deleted rows
+    @timedQuery("DELETE")
+    def deleteRowsOf(self, source):
+        conn = self.__connect()
+        table = self.__targetTable(conn, source)
+        key = self.__mapping.keyColumn
+        deleted = conn.execute(f"DELETE FROM {self.__tableName} WHERE {key} IN (SELECT {key} FROM {table})").rowcount
+        self.__commit(conn)
+        self.__release(conn)
+        return deleted
+
+    # execute one statement with parameters in own transaction
+    def __execute(self, sqlQuery, params=()):
+        conn = self.__connect()
+        conn.execute(sqlQuery, params)
+        self.__commit(conn)
+        self.__release(conn)
+
+    @timedQuery("INSERT")
     def add(self, tableFields, taskValue):
 
         if len(tableFields) == len(taskValue) and len(tableFields) > 0 and len(taskValue) > 0:
-            conn = sqlite3.connect(self.__dbPath)
+            conn = self.__connect()
             c = conn.cursor()
-            insTableFields = ""
-            for field in tableFields:  # Fields to Insert
-                insTableFields = insTableFields + field + ", "
-            insTableFields = insTableFields[:-2]  # Remove 2 last symbols
-            tmp = len(taskValue)  # начали формировать значения для вставки в таблицу
-            insTableValues = ""
-            for value in taskValue:  # Values to insert
-                insTableValues = insTableValues + " ?, "
-            insTableValues = insTableValues[:-2]  # Remove 2 last symbols
-            # закончили формировать значения для вставки в таблицу
-            sqlQuery = f"INSERT INTO {self.__tableName} ({insTableFields}) VALUES({insTableValues})"
-            c.execute(sqlQuery, taskValue)
-            conn.commit();
+            c.execute(self.__mapping.insertStatement(tableFields), taskValue)
+            self.__commit(conn);
             id = c.lastrowid;  # получили ID вставленной задачи
-            conn.close();  # закрыли соединение с бд
+            self.__release(conn)
             return id
         else:
             raise ValueError("Not correct fields for insert")
 
-        # values  - словарь, где ключ это название поля в БД, значение это новое значение
+    # insert many rows in one transaction, taskValues - list of values lists
+    # return ids of inserted rows (rowid of every insert: rows with given or reused ids are not consecutive)
+    @timedQuery("INSERT")
+    def addMany(self, tableFields, taskValues):
+        if len(tableFields) > 0 and all(len(tableFields) == len(taskValue) for taskValue in taskValues):
+            conn = self.__connect()
+            c = conn.cursor()
+            sqlQuery = self.__mapping.insertStatement(tableFields)
+            ids = []
+            for taskValue in taskValues:
+                c.execute(sqlQuery, taskValue)
+                ids.append(c.lastrowid)
+            self.__commit(conn)
+            self.__release(conn)
+            return ids
+        else:
+            raise ValueError("Not correct fields for insert")
 
+    # update - dict, key is field name in database, value is new value (passed as parameter)
+    @timedQuery("UPDATE")
     def update(self, update, condition):
-        conn = sqlite3.connect(self.__dbPath, timeout=10)
-        c = conn.cursor()
-        keys = list(update.keys())  # список с ключами
-        updateValues = ""
-        for key in keys:
-            updateValues = updateValues + str(key) + "=\'" + str(update[key]) + "\', "
-        updateValues = updateValues[:-2]  # Remove 2 last symbols
-
-        if condition != "":
-            sqlQuery = f"UPDATE {str(self.__tableName)} SET {updateValues} WHERE {condition}"
-        else:
-            sqlQuery = f"UPDATE {str(self.__tableName)} SET {updateValues}"
-        c.execute(sqlQuery)
-        conn.commit()
-        conn.close()
+        self.__execute(self.__mapping.updateStatement(list(update.keys()), condition), list(update.values()))
+
+    # updates - list of (update, condition) pairs, all of them are written in one transaction
+    @timedQuery("UPDATE")
+    def updateMany(self, updates):
+        if len(updates) == 0:
+            return
+        conn = self.__connect()
+        for update, condition in updates:
+            conn.execute(self.__mapping.updateStatement(list(update.keys()), condition), list(update.values()))
+        self.__commit(conn)
+        self.__release(conn)
+
+    # update of row with primary key value id
+    @timedQuery("UPDATE")
+    def updateById(self, id, update):
+        self.__execute(self.__mapping.updateStatement(list(update.keys())), list(update.values()) + [id])
+
+    # updates - list of (id, update) pairs written in one transaction, rows with the same fields are written
+    # by one executemany, condition - rows are updated only if it is true (f.e. State='RUN')
+    @timedQuery("UPDATE")
+    def updateManyById(self, updates, condition=""):
+        if len(updates) == 0:
+            return
+        conn = self.__connect()
+        for columns, group in itertools.groupby(updates, key=lambda update: tuple(update[1].keys())):
+            sqlQuery = self.__mapping.updateStatement(columns)
+            if condition != "":
+                sqlQuery = sqlQuery + f" AND ({condition})"
+            conn.executemany(sqlQuery, [list(update.values()) + [id] for id, update in group])
+        self.__commit(conn)
+        self.__release(conn)
 
     # WARN: is private!!
+    @timedQuery("DELETE")
     def __delete(self, condition):
-        conn = sqlite3.connect(self.__dbPath)
-        c = conn.cursor()
         if condition != "":
             sqlQuery = f"DELETE FROM {str(self.__tableName)} WHERE {condition}"
         else:
             sqlQuery = f"DELETE FROM {str(self.__tableName)}"  # WARN: delete all row
-        c.execute(sqlQuery)
-        conn.commit()
-        conn.close()
+        self.__execute(sqlQuery)
 
+    @timedQuery("DELETE")
     def deleteById(self, id):
-        condition = f"id={id}"
-        self.__delete(condition)
+        self.__execute(self.__mapping.deleteStatement(), (id,))
+
+    # delete rows with values of field (primary key if fieldName is None) in one transaction
+    @timedQuery("DELETE")
+    def deleteMany(self, values, fieldName=None):
+        if len(values) == 0:
+            return
+        conn = self.__connect()
+        conn.executemany(self.__mapping.deleteStatement(fieldName), [(value,) for value in values])
+        self.__commit(conn)
+        self.__release(conn)
+
+    # count of rows matching the condition
+    @timedQuery("SELECT")
+    def getCount(self, condition=""):
+        conn = self.__connect()
+        if condition != "":
+            sqlQuery = f"SELECT COUNT(*) FROM {str(self.__tableName)} WHERE {condition}"
+        else:
+            sqlQuery = f"SELECT COUNT(*) FROM {str(self.__tableName)}"
+        count = conn.execute(sqlQuery).fetchone()[0]
+        self.__release(conn)
+        return count
+
+    # columns of table in database (table created before mapping could have other columns)
+    def __tableColumns(self, conn):
+        if self.__columns is None:
+            self.__columns = frozenset(row[1] for row in conn.execute(f"PRAGMA table_info({self.__tableName})"))
+        return self.__columns
+
+    # Stream rows matching the condition, only dbFields are selected
+    # Rows are read from cursor by chunks of chunkSize and yielded as tuples (namedtuples if namedRows)
+    # f.e. for dbFields ["id", "Name"]: (1, 'name example'), (2, 'name exmple 2')
+    def iterData(self, condition, dbFields, chunkSize=1000, namedRows=False):
+        rowType = namedtuple("Row", dbFields) if namedRows else None
+        for rows in self.iterChunks(condition, dbFields, chunkSize):
+            for row in rows:
+                yield rowType._make(row) if rowType is not None else row
+
+    # Stream rows matching the condition as lists of at most chunkSize tuples (for filling of arrays by chunks)
+    def iterChunks(self, condition, dbFields, chunkSize=1000):
+        conn = self.__connect()
+        try:
+            c = conn.cursor()
+            sqlQuery = self.__mapping.selectStatement(dbFields)
+            if condition != "":
+                sqlQuery = sqlQuery + f" WHERE {condition}"
+            unknown = [field for field in dbFields if field not in self.__tableColumns(conn)]
+            if len(unknown) > 0:
+                raise ValueError(f"Not correct fields for select: {', '.join(unknown)}")
+            start = time.perf_counter()
+            c.execute(sqlQuery)
+            if metrics is not None:  # only execute is timed, reading of chunks depends on consumer
+                metrics.record("DBConnector.SELECT", time.perf_counter() - start)
+            while True:
+                rows = c.fetchmany(chunkSize)
+                if len(rows) == 0:
+                    break
+                if metrics is not None:
+                    metrics.increment("DBConnector.rowsRead", len(rows))
+                yield rows
+            c.close()
+        finally:
+            self.__release(conn)
+
+    # Keyset pagination: at most limit rows matching the condition with (orderFields) > afterKey, ordered by orderFields
+    # Returned data has the same format as getData, only dbFields are selected, params - parameters of condition
+    @timedQuery("SELECT")
+    def getPage(self, condition, dbFields, orderFields, afterKey=None, limit=100, params=()):
+        conn = self.__connect()
+        conditions = []
+        params = list(params)
+        if condition != "":
+            conditions.append(f"({condition})")
+        if afterKey is not None:
+            conditions.append(f"({', '.join(orderFields)}) > ({', '.join('?' for field in orderFields)})")
+            params.extend(afterKey)
+        sqlQuery = self.__mapping.selectStatement(dbFields)
+        if len(conditions) > 0:
+            sqlQuery = sqlQuery + " WHERE " + " AND ".join(conditions)
+        sqlQuery = sqlQuery + f" ORDER BY {', '.join(orderFields)} LIMIT ?"
+        params.append(limit)
+        results = [zip(dbFields, row) for row in conn.execute(sqlQuery, params)]
+        self.__release(conn)
+        return results
+
+    # aggregate expressions (f.e. SUM(WorkTime)) over rows matching the condition, returns tuple of values
+    # params - parameters of condition
+    @timedQuery("SELECT")
+    def getAggregate(self, expressions, condition="", params=()):
+        conn = self.__connect()
+        sqlQuery = f"SELECT {', '.join(expressions)} FROM {str(self.__tableName)}"
+        if condition != "":
+            sqlQuery = sqlQuery + f" WHERE {condition}"
+        result = conn.execute(sqlQuery, params).fetchone()
+        self.__release(conn)
+        return result
 
     # Get all data from the database matching the condition
     # Data will be returned only if the database contains all the fields described in the dbFields list
     # Returned data example: [[(id, 1), (name, 'name example')], [(id,2), (name, 'name exmple 2')]]
+    @timedQuery("SELECT")
     def getData(self, condition, dbFields):
-        conn = sqlite3.connect(self.__dbPath)
+        conn = self.__connect()
         c = conn.cursor()
         if condition != "":
             sqlQuery = f"SELECT * FROM {str(self.__tableName)} WHERE {condition}"
@@ -217,28 +1178,198 @@ class DBConnector:
                 fields = [field for field in fields_names]
                 values = [values for values in row]
                 results.append(zip(fields, values))
-            conn.close()
+            self.__release(conn)
             return results
         else:
-            conn.close()
+            self.__release(conn)
             return None
 
 
+# Compact storage of finished tasks: one array per column (rows are sorted by task id), names are interned
+# Task objects are created on request and live while they are used
+class TaskArchive:
+    stateCodes = ("", "RUN", "STOP", "PAUSED")
+
+    def __init__(self, observer):
+        self.__observer = observer
+        self.__ids = array("q")
+        self.__dateStart = array("q")
+        self.__dateEnd = array("q")  # -1 - task without dateEnd
+        self.__state = array("b")
+        self.__workTime = array("q")
+        self.__names = []
+        self.__tasks = weakref.WeakValueDictionary()  # task id -> created task
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def __contains__(self, taskId):
+        return self.__position(taskId) >= 0
+
+    @property
+    def ids(self):
+        return self.__ids
+
+    @property
+    def workTimes(self):
+        return self.__workTime
+
+    def __position(self, taskId):
+        pos = bisect.bisect_left(self.__ids, taskId)
+        if pos < len(self.__ids) and self.__ids[pos] == taskId:
+            return pos
+        return -1
+
+    def add(self, task):
+        taskId = task.taskId
+        pos = len(self.__ids)
+        if pos > 0 and self.__ids[-1] > taskId:  # rows from database are usually ordered by id
+            pos = bisect.bisect_left(self.__ids, taskId)
+        self.__ids.insert(pos, taskId)
+        self.__dateStart.insert(pos, int(task.dateStart))
+        self.__dateEnd.insert(pos, int(float(task.dateEnd)) if task.dateEnd is not None else -1)
+        self.__state.insert(pos, self.stateCodes.index(task.state))
+        self.__workTime.insert(pos, int(task.closedWorkTime or 0))
+        self.__names.insert(pos, sys.intern(str(task.taskName)))
+
+    def remove(self, taskId):
+        pos = self.__position(taskId)
+        if pos >= 0:
+            for column in (self.__ids, self.__dateStart, self.__dateEnd, self.__state, self.__workTime, self.__names):
+                del column[pos]
+            self.__tasks.pop(taskId, None)
+
+    # remove rows of all taskIds by one pass over columns
+    def removeMany(self, taskIds):
+        keep = [pos for pos, taskId in enumerate(self.__ids) if taskId not in taskIds]
+        if len(keep) == len(self.__ids):
+            return
+        self.__ids = array("q", (self.__ids[pos] for pos in keep))
+        self.__dateStart = array("q", (self.__dateStart[pos] for pos in keep))
+        self.__dateEnd = array("q", (self.__dateEnd[pos] for pos in keep))
+        self.__state = array("b", (self.__state[pos] for pos in keep))
+        self.__workTime = array("q", (self.__workTime[pos] for pos in keep))
+        self.__names = [self.__names[pos] for pos in keep]
+        for taskId in taskIds:
+            self.__tasks.pop(taskId, None)
+
+    def workTime(self, taskId):
+        return self.__workTime[self.__position(taskId)]
+
+    # positions of many task ids by one numpy search, -1 - task is not in archive
+    def positions(self, taskIds):
+        wanted = numpy.asarray(taskIds, dtype=numpy.int64)
+        if len(self.__ids) == 0:
+            return numpy.full(len(wanted), -1, dtype=numpy.int64)
+        ids = numpy.frombuffer(self.__ids, dtype=numpy.int64)  # view, released before columns are changed
+        pos = numpy.minimum(numpy.searchsorted(ids, wanted), len(ids) - 1)
+        return numpy.where(ids[pos] == wanted, pos, -1)
+
+    # work time of archived tasks at positions
+    def workTimesAt(self, positions):
+        return numpy.frombuffer(self.__workTime, dtype=numpy.int64)[positions]
+
+    def dateEnd(self, taskId):
+        dateEnd = self.__dateEnd[self.__position(taskId)]
+        return dateEnd if dateEnd >= 0 else None
+
+    # task object for archived row, KeyError if task is not in archive
+    def getTask(self, taskId):
+        task = self.__tasks.get(taskId)
+        if task is None:
+            pos = self.__position(taskId)
+            if pos < 0:
+                raise KeyError(taskId)
+            task = Task(self.__names[pos], self.__dateStart[pos], self.__workTime[pos], self.__observer)
+            task.taskId = taskId
+            task.state = self.stateCodes[self.__state[pos]]
+            if self.__dateEnd[pos] >= 0:
+                task.dateEnd = self.__dateEnd[pos]
+            self.__tasks[taskId] = task
+        return task
+
+    # (task id, dateStart, dateEnd, workTime) of all rows, dateEnd is None if task has no dateEnd
+    def items(self):
+        for pos in range(len(self.__ids)):
+            dateEnd = self.__dateEnd[pos]
+            yield self.__ids[pos], self.__dateStart[pos], dateEnd if dateEnd >= 0 else None, self.__workTime[pos]
+
+
 class TaskStorage:
-    def __init__(self, dBConnector, ormMapping):
+    # segmentConnector - DBConnector for TaskSegment table (run segments of tasks), None - segments are not saved
+    # pageSize - finished tasks are not loaded at start, finished views read them from database by pages of pageSize
+    #            (None - all tasks are loaded at start)
+    # dbWorker - DBWorker for writes, changes are applied in memory at once and written by worker thread
+    #            (None - writes are executed in calling thread)
+    # frameRate - ticks of running tasks are sent to model by RefreshCoalescer at most frameRate times per second
+    #             (None - every tick is sent to model at once in scheduler thread)
+    # journalPath - ticks of running tasks are appended to TickJournal file, work time of run segments is recovered
+    #               from it after crash (None - time of open segments is lost by crash)
+    # compactInterval, compactRecords - journal is written to Task table after compactInterval seconds or
+    #                                   compactRecords records
+    # archiveConnector - DBConnector for archive table (in the same or other database file) with the same columns,
+    #                    finished tasks are moved to it and finished views read it, Task table keeps active tasks
+    #                    (None - finished tasks are kept in Task table)
+    def __init__(self, dBConnector, ormMapping, scheduler=None, segmentConnector=None, pageSize=None, dbWorker=None,
+                 frameRate=None, journalPath=None, compactInterval=300, compactRecords=10000, archiveConnector=None):
         self.__taskList = OrderedDict()
         self.__dBConnector = dBConnector
-        self.__ormMapping = ormMapping
+        self.__segmentConnector = segmentConnector
+        self.__archiveConnector = archiveConnector
+        # table of finished tasks
+        self.__finishedConnector = archiveConnector if archiveConnector is not None else dBConnector
+        self.__archivedIds = set()  # tasks moved to archive table in this session
+        self.__ormMapping = OrmMapping(ormMapping)
         self.__Model = None
-        self.__primaryObj = None
+        self.__primaryObj = self.__ormMapping.primary
         self.__filterState = FilteredState.NoFilter
-        self.__filteredList = OrderedDict()
+        self.__archive = TaskArchive(self)  # finished tasks loaded at start (all tasks are loaded)
+        self.__filteredRows = []  # filtered tasks by row number, archived tasks are kept as task id
+        self.__filteredKeys = []  # sort keys of __filteredRows, sorted for search of row position
+        self.__filterKey = None  # sort key function of applied filter, None - rows are ordered by task id
+        self.__dateEndValues = array("q")  # dateEnd of tasks with dateEnd, sorted by (dateEnd, task id)
+        self.__dateEndIds = array("q")  # task ids of __dateEndValues
+        self.__dateEndIndexed = dict()  # task id -> indexed dateEnd of not archived tasks
+        # aggregates of work time for filtered tasks, running tasks are added on request
+        self.__aggTotal = 0  # sum of closed work time
+        self.__aggTasks = dict()  # task id -> (closed work time, segment start) included in aggregates
+        self.__aggSorted = []  # (closed work time, task id) of not running tasks, for min/max
+        self.__aggRunning = dict()  # task id -> (closed work time, segment start) of running tasks
+        self.__aggArchiveTotal = 0  # aggregates of archived rows
+        self.__aggArchiveSorted = array("q")  # sorted work time of archived rows
+        self.__pageSize = pageSize
+        self.__archiveTasks = dict()  # task id -> finished task loaded by page (paged mode)
+        self.__archiveDateEnd = dict()  # task id -> dateEnd of task loaded by page
+        # (condition, params, order fields, key of row -> order values, connector) of paged filter
+        self.__pageQuery = None
+        self.__pageAfter = None  # order values of last loaded row
+        self.__pageDone = True  # all rows of paged filter are loaded
+        self.__unloadedStats = None  # (sum, count, min, max) of work time for not loaded rows of paged filter
         self.__applyedFilter = None;
-
-        for obj in self.__ormMapping:
-            for fieldType in obj.dbFieldType:
-                if fieldType == dbTypeField.PKEY:  # Primary Key field name
-                    self.__primaryObj = obj
+        self.__pendingLock = threading.Lock()
+        self.__scheduler = scheduler if scheduler is not None else TaskScheduler()
+        self.__batchUpdates = None  # (task id, update) written together by bulk operation
+        self.__batchSegments = None  # (segment id, update) of segments closed by bulk operation
+        self.__dbWorker = dbWorker
+        self.__unconfirmed = dict()  # task id -> count of writes submitted to worker and not confirmed yet
+        self.__failedTasks = set()  # tasks with failed writes, they are read again when all writes are confirmed
+        self.__writeErrorHandler = None
+        self.__writeCount = 0  # writes submitted to worker, reads are repeated if writes were submitted meanwhile
+        self.__filterGeneration = 0  # reads of replaced filter are dropped
+        self.__fetching = False  # page is read by worker
+        self.__refresh = RefreshCoalescer(self.__applyViewChanges, frameRate) if frameRate is not None else None
+        # ids of new rows are given by storage, so task is added without waiting for database
+        self.__insertFields = [self.__dbField(prop) for prop in ("taskId", "taskName", "dateStart", "state",
+                                                                 "workTime")]
+        self.__lastTaskId = 0
+        self.__lastSegmentId = 0
+        self.__journal = TickJournal(journalPath) if journalPath is not None else None
+        self.__journalLock = threading.Lock()
+        self.__journaled = dict()  # task id -> [task, time of last record] for running tasks
+        self.__compactInterval = compactInterval
+        self.__compactRecords = compactRecords
+        self.__lastCompaction = time.monotonic()
+        self.__compacting = False  # compaction is submitted and not written yet
         self.__initStorage()
         self.viewActiveTask()
 
@@ -250,31 +1381,296 @@ class TaskStorage:
     def Model(self):
         return self.__Model
 
+    @property
+    def scheduler(self):
+        return self.__scheduler
+
     @Model.setter
     def Model(self, model):
         self.__Model = model
 
+    # count of writes which are not confirmed by worker
+    @property
+    def unconfirmedWrites(self):
+        with self.__pendingLock:
+            return sum(self.__unconfirmed.values())
+
+    # function(error) called in gui thread when request of worker failed (without handler error is raised in
+    # gui thread like error of write in calling thread)
+    @property
+    def writeErrorHandler(self):
+        return self.__writeErrorHandler
+
+    @writeErrorHandler.setter
+    def writeErrorHandler(self, handler):
+        self.__writeErrorHandler = handler
+
+    # function(*args) writes rows of taskIds: by worker in order of calls or at once if storage has no worker
+    def __write(self, taskIds, function, *args):
+        if self.__dbWorker is None:
+            function(*args)
+            return
+        with self.__pendingLock:
+            self.__writeCount += 1
+            for taskId in taskIds:
+                self.__unconfirmed[taskId] = self.__unconfirmed.get(taskId, 0) + 1
+        self.__dbWorker.submit(function, args, lambda result, error: self.__confirm(taskIds, error))
+
+    # worker executed write: tasks of failed write are read again from database when their writes are finished
+    def __confirm(self, taskIds, error):
+        if error is not None:
+            self.__failedTasks.update(taskIds)
+            if metrics is not None:
+                metrics.increment("TaskStorage.writeErrors")
+        reload = []
+        with self.__pendingLock:
+            for taskId in taskIds:
+                count = self.__unconfirmed.pop(taskId, 0) - 1
+                if count > 0:
+                    self.__unconfirmed[taskId] = count
+                elif taskId in self.__failedTasks:
+                    reload.append(taskId)
+        for taskId in reload:
+            self.__failedTasks.discard(taskId)
+            self.__reloadTask(taskId)
+        if error is not None:
+            self.__reportError(error)
+
+    def __reportError(self, error):
+        if self.__writeErrorHandler is None:
+            raise error
+        self.__writeErrorHandler(error)
+
+    # function(*args) reads database after submitted writes, apply(result) is called with read rows
+    # with worker rows are read by worker thread and applied in gui thread, so gui thread doesn't wait for writes:
+    # read is repeated if writes were submitted meanwhile and dropped if filter is replaced
+    def __read(self, function, args, apply):
+        if self.__dbWorker is None:
+            apply(function(*args))
+            return
+        generation = self.__filterGeneration
+        with self.__pendingLock:
+            writeCount = self.__writeCount
+
+        def complete(result, error):
+            if generation != self.__filterGeneration:
+                return
+            if error is not None:
+                self.__fetching = False
+                self.__reportError(error)
+            elif writeCount != self.__writeCount:
+                self.__read(function, args, apply)
+            else:
+                apply(result)
+
+        self.__dbWorker.submit(function, args, complete)
+
+    # replace task in memory by its row in database (row is missing - task is removed)
+    def __reloadTask(self, taskId):
+        dbFieldList = [obj.dbFieldName for obj in self.__ormMapping]
+        condition = f"{self.__primaryObj.dbFieldName}={int(taskId)}"
+        rows = list(self.__dBConnector.iterData(condition, dbFieldList))
+        self.__archivedIds.discard(taskId)
+        if len(rows) == 0 and self.__archiveConnector is not None:
+            rows = list(self.__archiveConnector.iterData(condition, dbFieldList))
+            if len(rows) > 0:
+                self.__archivedIds.add(taskId)
+        self.__forgetTask(taskId)
+        if len(rows) > 0:
+            task = self.__createTask(zip(dbFieldList, rows[0]))
+            if task.state == "RUN" or task.state == "":  # run segment of task is not open in memory
+                task.state = "PAUSED"
+            self.__taskList[taskId] = task
+            self.__indexDateEnd(task)
+            self.__refilterTask(task)
+
     def addTask(self, taskName):
-        insertFields = ["Name", "DateStart", "State", "WorkTime"]
+        insertFields = self.__insertFields
         startTime = int(time.time())  # str(time.mktime(datetime.datetime.utcnow().timetuple()))
-        insertValues = [str(taskName), startTime, "", 0]
+        self.__lastTaskId += 1
+        insertValues = [self.__lastTaskId, str(taskName), startTime, "", 0]
         task = Task(taskName, startTime, 0, self)
-        task.taskId = self.__dBConnector.add(insertFields, insertValues)
+        task.taskId = self.__lastTaskId
+        self.__write([task.taskId], self.__dBConnector.add, insertFields, insertValues)
         self.__taskList[
             getattr(task, self.__primaryObj.objectPropertyName)] = task
-        if self.__applyedFilter != None:  # refresh filterList
-            self.__applyFilter(self.__applyedFilter)
+        self.__refilterTask(task)  # refresh filterList
 
     def deleteTask(self, taskId):
-        self.__dBConnector.deleteById(taskId)
+        self.__write([taskId], self.__transaction, self.__deleteWrites([taskId]))
+        self.__forgetTask(taskId)
+
+    # remove task from memory
+    def __forgetTask(self, taskId):
         if taskId in self.__taskList:
-            del self.__taskList[taskId]
-        if self.__applyedFilter != None:  # refresh filterList
-            self.__applyFilter(self.__applyedFilter)
-        self.__Model.dataChangedInternaly()
+            self.__scheduler.unregister(self.__taskList[taskId])
+        if self.__journal is not None:
+            with self.__journalLock:
+                self.__journaled.pop(taskId, None)
+        if taskId in self.__taskList or taskId in self.__archiveTasks or taskId in self.__archive:
+            task = self.getTaskFromId(taskId)
+            self.__unindexDateEnd(task)
+            self.__taskList.pop(taskId, None)
+            self.__archiveTasks.pop(taskId, None)
+            self.__archiveDateEnd.pop(taskId, None)
+            self.__archive.remove(taskId)
+            self.__refilterTask(task)  # refresh filterList
+
+    # add tasks in one transaction, model gets one reset instead of inserted rows
+    def addTasks(self, taskNames):
+        if len(taskNames) == 0:
+            return
+        startTime = int(time.time())
+        taskIds = list(range(self.__lastTaskId + 1, self.__lastTaskId + len(taskNames) + 1))
+        self.__lastTaskId += len(taskNames)
+        self.__write(taskIds, self.__dBConnector.addMany, self.__insertFields,
+                     [[taskId, str(taskName), startTime, "", 0] for taskId, taskName in zip(taskIds, taskNames)])
+        model = self.__beginBatch()
+        try:
+            for taskName, taskId in zip(taskNames, taskIds):
+                task = Task(taskName, startTime, 0, self)
+                task.taskId = taskId
+                self.__taskList[taskId] = task
+                self.__refilterTask(task)
+        finally:
+            self.__endBatch(model)
+
+    # delete tasks and their segments in one transaction, filtered list is rebuilt by one pass
+    def deleteTasks(self, taskIds):
+        taskIds = set(taskIds)
+        if len(taskIds) == 0:
+            return
+        for taskId in taskIds:
+            if taskId in self.__taskList:
+                self.__scheduler.unregister(self.__taskList[taskId])
+        if self.__journal is not None:  # checkpoints of deleted tasks are not written by compaction
+            with self.__journalLock:
+                for taskId in taskIds:
+                    self.__journaled.pop(taskId, None)
+        self.__write(list(taskIds), self.__transaction, self.__deleteWrites(list(taskIds)))
+        model = self.__beginBatch()
+        try:
+            for taskId in taskIds:
+                if taskId in self.__taskList or taskId in self.__archiveTasks or taskId in self.__archive:
+                    self.__unindexDateEnd(self.getTaskFromId(taskId))
+                    self.__taskList.pop(taskId, None)
+                    self.__archiveTasks.pop(taskId, None)
+                    self.__archiveDateEnd.pop(taskId, None)
+            self.__archive.removeMany(taskIds)
+            keep = [pos for pos, row in enumerate(self.__filteredRows)
+                    if (row if type(row) is int else self.__taskId(row)) not in taskIds]
+            self.__filteredRows = [self.__filteredRows[pos] for pos in keep]
+            self.__filteredKeys = [self.__filteredKeys[pos] for pos in keep]
+            self.__rebuildAggregates()
+            if self.__pageQuery is not None and not self.__pageDone:  # deleted rows could be not loaded yet
+                pageAfter = self.__pageAfter
+                self.__read(self.__queryUnloadedStats, (self.__pageQuery, pageAfter),
+                            lambda stats: self.__setUnloadedStats(pageAfter, stats))
+        finally:
+            self.__endBatch(model)
+
+    # stop tasks, their rows and segments are written in one transaction by one executemany per table
+    def stopTasks(self, taskIds):
+        model = self.__beginBatch()
+        self.__batchUpdates = []
+        self.__batchSegments = []
+        try:
+            for taskId in taskIds:
+                try:
+                    task = self.getTaskFromId(taskId)
+                except KeyError:
+                    continue
+                if task.state != "STOP":
+                    task.stopTask()
+        finally:
+            updates, self.__batchUpdates = self.__batchUpdates, None
+            segments, self.__batchSegments = self.__batchSegments, None
+            writes = self.__updateWrites(updates)
+            if self.__segmentConnector is not None and len(segments) > 0:
+                writes.append((self.__segmentConnector.updateManyById, ([update for taskId, update in segments],)))
+            if len(writes) > 0:
+                self.__write([taskId for taskId, update in updates + segments], self.__transaction, writes)
+            self.__endBatch(model)
+
+    # writes of rows and segments of one operation are committed together
+    def __transaction(self, writes):
+        with self.__dBConnector.transaction(self.__archiveConnector, self.__segmentConnector):
+            for function, args in writes:
+                function(*args)
+
+    # (function, args) writes which delete tasks and their segments
+    def __deleteWrites(self, taskIds):
+        if self.__archiveConnector is None:
+            writes = [(self.__dBConnector.deleteMany, (taskIds,))]
+        else:
+            writes = [(self.__deleteRows, (taskIds,))]
+            self.__archivedIds.difference_update(taskIds)
+        if self.__segmentConnector is not None:
+            writes.append((self.__segmentConnector.deleteMany, (taskIds, "TaskId")))
+        return writes
+
+    # (task id, update) pairs are written to table of task rows in one transaction
+    def __writeUpdates(self, updates):
+        self.__write([taskId for taskId, update in updates], self.__transaction, self.__updateWrites(updates))
+
+    # (function, args) writes of updates: finished tasks are moved to archive table after update, restarted finished
+    # tasks are moved back to Task table before update
+    def __updateWrites(self, updates):
+        if self.__archiveConnector is None:
+            return [(self.__dBConnector.updateManyById, (updates,))] if len(updates) > 0 else []
+        stateField = self.__dbField("state")
+        active, archiving, archived, restoring = [], [], [], []
+        for taskId, update in updates:
+            isArchived = self.__isArchived(taskId)
+            state = update.get(stateField)
+            if state is None:
+                (archived if isArchived else active).append((taskId, update))
+            elif state == "STOP":
+                (archived if isArchived else archiving).append((taskId, update))
+                self.__archivedIds.add(taskId)
+            else:
+                (restoring if isArchived else active).append((taskId, update))
+                self.__archivedIds.discard(taskId)
+        return [(function, (group,)) for function, group in
+                ((self.__dBConnector.updateManyById, active), (self.__archiveRows, archiving),
+                 (self.__archiveConnector.updateManyById, archived), (self.__restoreRows, restoring)) if len(group) > 0]
+
+    # row of task is in archive table
+    def __isArchived(self, taskId):
+        return taskId in self.__archivedIds or taskId in self.__archiveTasks or taskId in self.__archive
+
+    # crash between update and move leaves finished row in Task table, it is moved by next start
+    def __archiveRows(self, updates):
+        self.__dBConnector.updateManyById(updates)
+        self.__dBConnector.moveManyById(self.__archiveConnector, [taskId for taskId, update in updates])
+
+    def __restoreRows(self, updates):
+        self.__archiveConnector.moveManyById(self.__dBConnector, [taskId for taskId, update in updates])
+        self.__dBConnector.updateManyById(updates)
+
+    def __deleteRows(self, taskIds):
+        self.__dBConnector.deleteMany(taskIds)
+        self.__archiveConnector.deleteMany(taskIds)
+
+    # changes of bulk operation are sent to model as one reset
+    def __beginBatch(self):
+        model = self.__Model
+        if model is not None:
+            model.beginFilterChange()
+        self.__Model = None
+        return model
+
+    def __endBatch(self, model):
+        self.__Model = model
+        if model is not None:
+            model.endFilterChange()
 
     def getTaskFromId(self, taskId):
-        return self.__taskList[taskId]
+        if taskId in self.__taskList:
+            return self.__taskList[taskId]
+        if taskId in self.__archiveTasks:
+            return self.__archiveTasks[taskId]
+        return self.__archive.getTask(taskId)
 
     def getTaskIdFromTask(self, task):
         id = -1
@@ -284,96 +1680,867 @@ class TaskStorage:
         return id
 
     def getElementCount(self):
-        return len(self.__filteredList)
+        return len(self.__filteredRows)
 
     # get task from filteredlist (not database)
     def getTaskByNum(self, num):
-        taskTuple = tuple(self.__filteredList.items())
-        if (num < len(taskTuple)):  # 0 index is task id, 1 index is task
-            return taskTuple[num][1]
+        if 0 <= num < len(self.__filteredRows):
+            return self.__rowTask(self.__filteredRows[num])
+        return None
+
+    # task id in row without creating task object for archived row
+    def getTaskIdByNum(self, num):
+        if 0 <= num < len(self.__filteredRows):
+            row = self.__filteredRows[num]
+            return row if type(row) is int else self.__taskId(row)
         return None
 
+    def __rowTask(self, row):
+        if type(row) is int:  # archived task
+            return self.__archive.getTask(row)
+        return row
+
     # read task from database and write this in tasklist and filteredlist
     def __initStorage(self):
         self.__taskList.clear()
+        self.__archive = TaskArchive(self)
         dbFieldList = []
         for obj in self.__ormMapping:
             dbFieldList.append(obj.dbFieldName)
-        taskDataList = self.__dBConnector.getData("", dbFieldList)  # get data from database
-        taskPropDict = OrderedDict()
-        # create task
-        for taskEl in taskDataList:
-            for taskField in taskEl:
-                taskPropDict[taskField[0]] = taskField[1]  # data from database
-
-            task = Task(taskPropDict['Name'], taskPropDict['DateStart'], taskPropDict['WorkTime'], self)
-            # set other property
-            for obj in self.__ormMapping:
-                prop = obj.objectPropertyName
-                type = obj.objectPropertyType
-                if type == FieldType.setter or type == FieldType.all:  # if setter
-                    if hasattr(task, prop):
-                        setattr(task, prop, taskPropDict[obj.dbFieldName])
+        recovered = self.__recoverJournal() if self.__journal is not None else dict()
+        condition = ""
+        if self.__archiveConnector is not None:
+            # finished rows of database created without archive table or left by crash
+            self.__dBConnector.moveTo(self.__archiveConnector, f"{self.__dbField('state')}=\'STOP\'")
+            # row of restarted task left in archive table by crash between commits of attached files
+            self.__archiveConnector.deleteRowsOf(self.__dBConnector)
+        elif self.__pageSize is not None:  # finished tasks are read by pages
+            condition = f"{self.__dbField('state')} IS NOT \'STOP\'"
+        rows = self.__dBConnector.iterData(condition, dbFieldList)
+        if self.__archiveConnector is not None and self.__pageSize is None:
+            rows = itertools.chain(rows, self.__archiveConnector.iterData("", dbFieldList))
+        # create task, rows are streamed from database
+        staleTasks = 0
+        for row in rows:
+            task = self.__createTask(zip(dbFieldList, row))
+            if task.state == "STOP":  # finished task is kept in columns
+                self.__archive.add(task)
+                continue
             self.__taskList[getattr(task, self.__primaryObj.objectPropertyName)] = task  # append task in tasklist
-            for task in self.__taskList.values():
-                if task.state == "RUN" or task.state == "":  # pause active task
-                    task.pauseTask()
-
-    def __applyFilter(self, filterCondition):
+            if task.state == "RUN" or task.state == "":  # pause active task, database is updated below
+                task.state = "PAUSED"
+                staleTasks += 1
+        if staleTasks > 0:  # one UPDATE for all active tasks of previous run
+            stateField = self.__dbField("state")
+            self.__dBConnector.update({stateField: "PAUSED"}, f"{stateField} IN (\'RUN\', \'\')")
+        indexed = [self.__dateEndKey(task) for task in self.__taskList.values() if task.dateEnd is not None]
+        self.__dateEndIndexed = dict((taskId, dateEnd) for dateEnd, taskId in indexed)
+        indexed.extend((dateEnd, taskId) for taskId, dateStart, dateEnd, workTime in self.__archive.items()
+                       if dateEnd is not None)
+        indexed.sort()
+        self.__dateEndValues = array("q", (key[0] for key in indexed))
+        self.__dateEndIds = array("q", (key[1] for key in indexed))
+        if self.__segmentConnector is not None:
+            self.__initSegments(recovered)
+            self.__lastSegmentId = self.__segmentConnector.getAggregate(
+                [f"MAX({self.__segmentConnector.ormMapping.keyColumn})"])[0] or 0
+        self.__lastTaskId = self.__dBConnector.getAggregate([f"MAX({self.__primaryObj.dbFieldName})"])[0] or 0
+        if self.__archiveConnector is not None:  # ids of archived tasks are not given again
+            self.__lastTaskId = max(self.__lastTaskId, self.__archiveConnector.getAggregate(
+                [f"MAX({self.__primaryObj.dbFieldName})"])[0] or 0)
+        if self.__journal is not None:  # recovered time is in database
+            self.__journal.reset()
+
+    # write work time of tasks from journal tail left by crash, return task id -> time of last record
+    def __recoverJournal(self):
+        recovered = self.__journal.replay()
+        if len(recovered) == 0:
+            return dict()
+        keyField = self.__primaryObj.dbFieldName
+        workField = self.__dbField("workTime")
+        ids = ", ".join(str(int(taskId)) for taskId in recovered)
+        updates = [(taskId, {workField: recovered[taskId][1]})
+                   for taskId, workTime in self.__dBConnector.iterData(f"{keyField} IN ({ids})", [keyField, workField])
+                   if recovered[taskId][1] > (workTime or 0)]
+        self.__dBConnector.updateManyById(updates)
+        return dict((taskId, lastTime) for taskId, (lastTime, workTime, closed) in recovered.items())
+
+    # create task from database row (pairs of field name and value)
+    def __createTask(self, taskEl):
+        taskPropDict = dict(taskEl)  # data from database
+        task = Task(taskPropDict[self.__dbField("taskName")], taskPropDict[self.__dbField("dateStart")],
+                    taskPropDict[self.__dbField("workTime")], self)
+        # set other property
+        for prop, dbFieldName in self.__ormMapping.setters:
+            if hasattr(task, prop):
+                setattr(task, prop, taskPropDict[dbFieldName])
+        return task
+
+    # database field name for task property
+    def __dbField(self, propertyName):
+        return self.__ormMapping.column(propertyName)
+
+    # close segments left open by crash and convert old WorkTime counters into segments
+    # recovered - task id -> time of last journal record
+    def __initSegments(self, recovered):
+        openSegments = list(self.__segmentConnector.iterData("SegmentEnd IS NULL", ["id", "TaskId", "SegmentStart"],
+                                                             namedRows=True))
+        # segment ends at last tick in journal, without journal time after last closed segment is lost
+        self.__segmentConnector.updateManyById(
+            [(segment.id, {"SegmentEnd": max(segment.SegmentStart, recovered.get(segment.TaskId, 0))})
+             for segment in openSegments])
+        if self.__segmentConnector.getCount() == 0:  # database created before TaskSegment table
+            # rows are read from database: finished tasks are not loaded in paged mode
+            fields = [self.__primaryObj.dbFieldName, self.__dbField("dateStart"), self.__dbField("workTime")]
+            condition = f"{self.__dbField('workTime')} > 0"
+            for connector in (self.__dBConnector, self.__archiveConnector):
+                if connector is None:
+                    continue
+                segments = []
+                for taskId, dateStart, workTime in connector.iterData(condition, fields, chunkSize=10000):
+                    segments.append([taskId, dateStart, dateStart + workTime])
+                    if len(segments) == 10000:
+                        self.__segmentConnector.addMany(["TaskId", "SegmentStart", "SegmentEnd"], segments)
+                        segments = []
+                if len(segments) > 0:
+                    self.__segmentConnector.addMany(["TaskId", "SegmentStart", "SegmentEnd"], segments)
+
+    # task started: new run segment in database, return segment id
+    def openSegment(self, task, segmentStart):
+        if self.__journal is not None:
+            with self.__journalLock:
+                self.__journaled[task.taskId] = [task, segmentStart]
+                self.__journal.append(task.taskId, segmentStart, task.closedWorkTime, TickJournal.checkpoint)
+        if self.__segmentConnector is None:
+            return -1
+        self.__lastSegmentId += 1
+        self.__write([task.taskId], self.__segmentConnector.add,
+                     [self.__segmentConnector.ormMapping.keyColumn, "TaskId", "SegmentStart"],
+                     [self.__lastSegmentId, task.taskId, segmentStart])
+        return self.__lastSegmentId
+
+    def closeSegment(self, task, segmentId, segmentEnd):
+        if self.__journal is not None:
+            with self.__journalLock:
+                self.__journaled.pop(task.taskId, None)
+                self.__journal.append(task.taskId, segmentEnd, task.closedWorkTime, TickJournal.closed)
+        if self.__segmentConnector is not None and segmentId > 0:
+            if self.__batchSegments is not None:
+                self.__batchSegments.append((task.taskId, (segmentId, {"SegmentEnd": segmentEnd})))
+            else:
+                self.__write([task.taskId], self.__segmentConnector.updateById, segmentId, {"SegmentEnd": segmentEnd})
+
+    # filterCondition - predicate for (task id, task), sortKey - function for order of rows (by task id if None)
+    # candidates - (keys, tasks) matching filterCondition and sorted by sortKey, used instead of scan of all tasks
+    # pageQuery - (condition, params, order fields, key of row -> order values, connector) for paged mode, rows are
+    #             loaded by fetchMore
+    @timedCall("TaskStorage.filterRebuild")
+    def __applyFilter(self, filterCondition, sortKey=None, candidates=None, pageQuery=None):
+        if self.__Model != None:
+            self.__Model.beginFilterChange()
+        self.__archiveTasks = dict()
+        self.__archiveDateEnd = dict()
+        self.__pageQuery = pageQuery
+        self.__pageAfter = None
+        self.__pageDone = pageQuery is None
+        self.__filterGeneration += 1
+        self.__fetching = False
         self.__applyedFilter = filterCondition
-        self.__filteredList = dict(filter(filterCondition, self.__taskList.items()))
+        self.__filterKey = sortKey
+        if candidates is not None:
+            self.__filteredKeys, self.__filteredRows = candidates
+        else:  # archived tasks are finished, filters of finished tasks give them in candidates
+            self.__filteredRows = [task for task in self.__taskList.values()
+                                   if filterCondition((self.__taskId(task), task))]
+            self.__filteredRows.sort(key=self.__rowKey)
+            self.__filteredKeys = [self.__rowKey(task) for task in self.__filteredRows]
+        self.__rebuildAggregates()
+        self.__unloadedStats = None  # paged filter: read with first page by fetchMore
         if self.__Model != None:
-            self.__Model.dataChangedInternaly()
-            self.__Model.update()
+            self.__Model.endFilterChange()
 
     # сбросить фильтр
+    @timedCall("TaskStorage.filterRebuild")
     def clearFilter(self):
+        if self.__Model != None:
+            self.__Model.beginFilterChange()
+        self.__archiveTasks = dict()
+        self.__archiveDateEnd = dict()
+        self.__pageQuery = None
+        self.__pageDone = True
+        self.__filterGeneration += 1
+        self.__fetching = False
+        self.__unloadedStats = None
         self.__applyedFilter = None
+        self.__filterKey = None
         self.__filterState = FilteredState.NoFilter
-        self.__filteredList = self.__taskList
+        self.__filteredKeys, self.__filteredRows = self.__mergeArchive(list(self.__taskList.values()))
+        self.__rebuildAggregates()
+        if self.__Model != None:
+            self.__Model.endFilterChange()
+
+    def __taskId(self, task):
+        return getattr(task, self.__primaryObj.objectPropertyName)
+
+    def __rowKey(self, task):
+        if self.__filterKey is None:
+            return self.__taskId(task)
+        return self.__filterKey(task)
+
+    def __dateEndKey(self, task):
+        return (int(float(task.dateEnd)), self.__taskId(task))
+
+    # row key of task in filtered list before its dateEnd was changed
+    def __indexedRowKey(self, task):
+        if self.__filterKey != self.__dateEndKey:
+            return self.__rowKey(task)
+        taskId = self.__taskId(task)
+        if taskId in self.__dateEndIndexed:
+            return (self.__dateEndIndexed[taskId], taskId)
+        if taskId in self.__archiveDateEnd:
+            return (self.__archiveDateEnd[taskId], taskId)
+        if taskId in self.__archive and self.__archive.dateEnd(taskId) is not None:
+            return (self.__archive.dateEnd(taskId), taskId)
+        return None
+
+    # (keys, rows) of tasks and all archived tasks ordered by task id
+    def __mergeArchive(self, tasks):
+        live = sorted((self.__taskId(task), task) for task in tasks)
+        if len(live) == 0:
+            return list(self.__archive.ids), list(self.__archive.ids)
+        merged = list(heapq.merge(live, ((taskId, taskId) for taskId in self.__archive.ids), key=lambda row: row[0]))
+        return [key for key, row in merged], [row for key, row in merged]
+
+    # position of (dateEnd, task id) in __dateEndValues and __dateEndIds
+    def __dateEndPosition(self, dateEnd, taskId):
+        low = bisect.bisect_left(self.__dateEndValues, dateEnd)
+        high = bisect.bisect_right(self.__dateEndValues, dateEnd)
+        return bisect.bisect_left(self.__dateEndIds, taskId, low, high)
+
+    # keep dateEnd index actual for changed task
+    def __indexDateEnd(self, task):
+        self.__unindexDateEnd(task)
+        if task.dateEnd is not None:
+            dateEnd, taskId = self.__dateEndKey(task)
+            pos = self.__dateEndPosition(dateEnd, taskId)
+            self.__dateEndValues.insert(pos, dateEnd)
+            self.__dateEndIds.insert(pos, taskId)
+            self.__dateEndIndexed[taskId] = dateEnd
+
+    def __unindexDateEnd(self, task):
+        taskId = self.__taskId(task)
+        if taskId in self.__dateEndIndexed:
+            dateEnd = self.__dateEndIndexed.pop(taskId)
+        elif taskId in self.__archive:
+            dateEnd = self.__archive.dateEnd(taskId)
+        else:
+            return
+        if dateEnd is not None:
+            pos = self.__dateEndPosition(dateEnd, taskId)
+            if pos < len(self.__dateEndIds) and self.__dateEndIds[pos] == taskId:
+                del self.__dateEndValues[pos]
+                del self.__dateEndIds[pos]
+
+    # archived task is changed: it is moved to task list
+    def __promoteTask(self, task):
+        taskId = self.__taskId(task)
+        if taskId in self.__archiveTasks:  # task loaded by page
+            del self.__archiveTasks[taskId]
+            if taskId in self.__archiveDateEnd:
+                self.__dateEndIndexed[taskId] = self.__archiveDateEnd.pop(taskId)
+            self.__taskList[taskId] = task
+            return
+        if taskId not in self.__archive:
+            return
+        pos = self.__findRow(task, self.__indexedRowKey(task))
+        if pos >= 0:
+            self.__unaggregateArchived(self.__archive.workTime(taskId))
+        dateEnd = self.__archive.dateEnd(taskId)
+        if dateEnd is not None:
+            self.__dateEndIndexed[taskId] = dateEnd
+        self.__archive.remove(taskId)
+        self.__taskList[taskId] = task
+        if pos >= 0:
+            self.__filteredRows[pos] = task
+            self.__aggregateTask(task)
+
+    # re-evaluate filter only for changed task and insert/remove it in filtered list (tasks are ordered by id)
+    # return True if task was added or removed
+    def __refilterTask(self, task):
+        taskId = self.__taskId(task)
+        matches = (taskId in self.__taskList or taskId in self.__archiveTasks or taskId in self.__archive) and (
+                self.__applyedFilter == None or bool(self.__applyedFilter((taskId, task))))
+        pos = self.__findRow(task)
+        if matches == (pos >= 0):
+            return False
+        key = self.__rowKey(task)
+        if matches and not self.__pageDone and (
+                self.__pageAfter is None or self.__pageQuery[3](task) > self.__pageAfter):
+            return False  # row is not loaded yet, it will be read by fetchMore
+        if matches:
+            pos = bisect.bisect_left(self.__filteredKeys, key)
+            if self.__Model != None:
+                self.__Model.beginInsertTask(pos)
+            self.__filteredKeys.insert(pos, key)
+            self.__filteredRows.insert(pos, task)
+            self.__aggregateTask(task)
+            if self.__Model != None:
+                self.__Model.endInsertTask()
+        else:
+            self.__removeRow(pos, task)
+        return True
+
+    def __removeRow(self, pos, task):
+        if self.__Model != None:
+            self.__Model.beginRemoveTask(pos)
+        del self.__filteredKeys[pos]
+        row = self.__filteredRows.pop(pos)
+        if type(row) is int:
+            self.__unaggregateArchived(task.closedWorkTime)
+        else:
+            self.__unaggregateTask(self.__taskId(task))
+        if self.__Model != None:
+            self.__Model.endRemoveTask()
+
+    # row number of task in filtered list, -1 if task is filtered out
+    def __findRow(self, task, key=None):
+        if key is None:
+            if self.__filterKey == self.__dateEndKey and task.dateEnd is None:
+                return -1  # rows are ordered by dateEnd, task without dateEnd is filtered out
+            key = self.__rowKey(task)
+        pos = bisect.bisect_left(self.__filteredKeys, key)
+        if pos < len(self.__filteredKeys) and self.__filteredKeys[pos] == key:
+            return pos
+        return -1
+
+    # refresh filtered list for changed task and send changed cells of its row to model (sendChange)
+    # return row of task, -1 if task is filtered out
+    def __taskChanged(self, task, propertyes, sendChange=True):
+        self.__promoteTask(task)
+        if "dateEnd" in propertyes:
+            pos = self.__findRow(task, self.__indexedRowKey(task))
+            if pos >= 0 and self.__filteredKeys[pos] != self.__rowKey(task):
+                self.__removeRow(pos, task)  # row key is changed, row is inserted again by __refilterTask
+            self.__indexDateEnd(task)
+        if not self.__refilterTask(task) and self.__findRow(task) >= 0:
+            self.__aggregateTask(task)  # closed work time or running state can be changed
+        row = self.__findRow(task)
+        if self.__Model != None and sendChange and row >= 0:
+            self.__Model.taskChanged(row, propertyes)
+        return row
+
+    # changes of frame collected by RefreshCoalescer are sent to model as one change of rows
+    def __applyViewChanges(self, changes):
+        rows = []
+        changed = set()
+        for task, propertyes in changes.items():
+            row = self.__taskChanged(task, propertyes, False)
+            if row >= 0:
+                rows.append(row)
+                changed.update(propertyes)
+        if self.__Model != None and len(rows) > 0:
+            self.__Model.tasksChanged(rows, changed)
+
+    # send ticks collected by coalescer to model at once
+    def flushView(self):
+        if self.__refresh is not None:
+            self.__refresh.flush()
 
     def viewActiveTask(self):
         self.__applyFilter(lambda task: task[1].state != "STOP")
 
     def viewAllFinishedTask(self):
-        self.__applyFilter(lambda task: task[1].state == "STOP")
-
+        if self.__pageSize is not None:
+            self.__applyFilter(lambda task: task[1].state == "STOP", None, ([], []),
+                               (f"{self.__dbField('state')}=\'STOP\'", [], [self.__primaryObj.dbFieldName],
+                                lambda task: (self.__taskId(task),), self.__finishedConnector))
+            self.fetchMore()  # first page
+            return
+        finished = [task for task in self.__taskList.values() if task.state == "STOP"]
+        self.__applyFilter(lambda task: task[1].state == "STOP", None, self.__mergeArchive(finished))
+
+    # rows are ordered by dateEnd and taken from dateEnd index
     def viewFinishedTaskBetweenDate(self, dateStart, dateEnd):
-        self.__applyFilter(
-            lambda task: task[1].dateEnd != None and int(float(task[1].dateEnd)) >= int(float(dateStart)) and int(
-                float(task[1].dateEnd)) <= int(float(dateEnd+86399))) # 86400 - seconds per day, bcs time in dateEnd start with 00:00:00
-                                                                     # now time in dateEnd is 23:59:59
+        start = int(float(dateStart))
+        end = int(float(dateEnd + 86399))  # 86400 - seconds per day, bcs time in dateEnd start with 00:00:00
+                                           # now time in dateEnd is 23:59:59
+        finishedOnly = self.__archiveConnector is not None  # restarted tasks are moved from archive table
+        filterCondition = lambda task: task[1].dateEnd != None and start <= int(float(task[1].dateEnd)) <= end and (
+                not finishedOnly or task[1].state == "STOP")
+        if self.__pageSize is not None:
+            dateEndField = self.__dbField("dateEnd")
+            self.__applyFilter(filterCondition, self.__dateEndKey, ([], []),
+                               (f"{dateEndField} BETWEEN ? AND ?", [start, end],
+                                [dateEndField, self.__primaryObj.dbFieldName], self.__dateEndKey,
+                                self.__finishedConnector))
+            self.fetchMore()  # first page
+            return
+        low = bisect.bisect_left(self.__dateEndValues, start)
+        high = bisect.bisect_right(self.__dateEndValues, end)
+        ids = self.__dateEndIds[low:high]
+        keys = list(zip(self.__dateEndValues[low:high], ids))
+        rows = [self.__taskList.get(taskId, taskId) for taskId in ids]
+        if finishedOnly:
+            keep = [pos for pos, row in enumerate(rows) if type(row) is int or row.state == "STOP"]
+            keys = [keys[pos] for pos in keep]
+            rows = [rows[pos] for pos in keep]
+        self.__applyFilter(filterCondition, self.__dateEndKey, (keys, rows))
+
+    # tasks with all words of query in name, last word of query can be beginning of word (full-text index of database)
+    # finished - True: only finished tasks, False: only not finished tasks, None: all tasks
+    # (paged mode with archive table: None is the same as False, archive table is paged only by finished view)
+    def viewTasksMatching(self, query, finished=None):
+        if finished is None and self.__pageSize is not None and self.__archiveConnector is not None:
+            finished = False
+        ftsQuery = DBConnector.prefixQuery(query)
+        if ftsQuery is None:  # nothing to search
+            {None: self.clearFilter, True: self.viewAllFinishedTask, False: self.viewActiveTask}[finished]()
+            return
+        words = ftsWords(query)
+        states = {None: lambda task: True, True: lambda task: task.state == "STOP",
+                  False: lambda task: task.state != "STOP"}[finished]
+        # new and changed tasks are checked in memory by the same rule
+        filterCondition = lambda task: states(task[1]) and self.__nameMatches(words, task[1].taskName)
+        if self.__pageSize is not None:
+            connector = self.__finishedConnector if finished else self.__dBConnector
+            condition, params = connector.matchCondition(ftsQuery)
+            if finished is not None:
+                condition += f" AND {self.__dbField('state')} {'=' if finished else 'IS NOT'} \'STOP\'"
+            self.__applyFilter(filterCondition, None, ([], []),
+                               (condition, params, [self.__primaryObj.dbFieldName], lambda task: (self.__taskId(task),),
+                                connector))
+            self.fetchMore()  # first page
+            return
+        # index is changed by writes of worker, ids are read after them
+        self.__read(self.__matchIds, (ftsQuery,), lambda taskIds: self.__applyMatches(taskIds, finished, states,
+                                                                                    filterCondition))
+
+    # ids of tasks matching FTS5 query in Task and archive tables, ordered by id
+    def __matchIds(self, ftsQuery):
+        taskIds = self.__dBConnector.matchIds(ftsQuery)
+        if self.__archiveConnector is not None:
+            taskIds = list(heapq.merge(taskIds, self.__archiveConnector.matchIds(ftsQuery)))
+        return taskIds
+
+    def __applyMatches(self, taskIds, finished, states, filterCondition):
+        keys = []
+        rows = []
+        archived = self.__archive.positions(taskIds) >= 0 if finished is not False else [False] * len(taskIds)
+        for taskId, isArchived in zip(taskIds, archived):
+            task = self.__taskList.get(taskId)
+            if task is not None:
+                if not states(task):
+                    continue
+                rows.append(task)
+            elif isArchived:
+                rows.append(taskId)
+            else:
+                continue
+            keys.append(taskId)
+        self.__applyFilter(filterCondition, None, (keys, rows))
+
+    def __nameMatches(self, words, name):
+        nameWords = ftsWords(str(name))
+        return all(word in nameWords for word in words[:-1]) and \
+            any(nameWord.startswith(words[-1]) for nameWord in nameWords)
+
+    # paged mode: filter has rows in database which are not loaded yet
+    def canFetchMore(self):
+        return not self.__pageDone
+
+    # paged mode: read next page of filtered rows from database and append them (with worker rows are appended when
+    # worker read them)
+    def fetchMore(self):
+        if self.__pageDone or self.__fetching:
+            return
+        self.__fetching = True
+        self.__read(self.__readPage, (self.__pageQuery, self.__pageAfter), self.__appendPage)
+
+    # (tasks of page, order values of last row, all rows are read, stats of rows after page)
+    def __readPage(self, pageQuery, pageAfter):
+        condition, params, orderFields, pageKey, connector = pageQuery
+        dbFieldList = [obj.dbFieldName for obj in self.__ormMapping]
+        tasks = [self.__createTask(taskEl) for taskEl in
+                 connector.getPage(condition, dbFieldList, orderFields, pageAfter, self.__pageSize, params)]
+        if len(tasks) > 0:
+            pageAfter = pageKey(tasks[-1])
+        pageDone = len(tasks) < self.__pageSize
+        return tasks, pageAfter, pageDone, None if pageDone else self.__queryUnloadedStats(pageQuery, pageAfter)
+
+    def __appendPage(self, page):
+        self.__fetching = False
+        pageTasks, self.__pageAfter, self.__pageDone, self.__unloadedStats = page
+        tasks = []
+        for task in pageTasks:
+            taskId = self.__taskId(task)
+            if taskId in self.__taskList:  # task is finished in this session
+                task = self.__taskList[taskId]
+            else:
+                self.__archiveTasks[taskId] = task
+                if task.dateEnd is not None:
+                    self.__archiveDateEnd[taskId] = self.__dateEndKey(task)[0]
+            if self.__findRow(task) < 0:
+                tasks.append(task)
+        if len(tasks) > 0:
+            first = len(self.__filteredRows)
+            if self.__Model != None:
+                self.__Model.beginAppendTasks(first, first + len(tasks) - 1)
+            for task in tasks:
+                self.__filteredRows.append(task)
+                self.__filteredKeys.append(self.__rowKey(task))
+                self.__aggregateTask(task)
+            if self.__Model != None:
+                self.__Model.endAppendTasks()
+
+    # (sum, count, min, max) of work time for rows of paged filter after pageAfter (not loaded yet)
+    def __queryUnloadedStats(self, pageQuery, pageAfter):
+        condition, params, orderFields, pageKey, connector = pageQuery
+        if pageAfter is not None:
+            condition = f"({condition}) AND ({', '.join(orderFields)}) > ({', '.join('?' for value in pageAfter)})"
+            params = list(params) + list(pageAfter)
+        workTimeField = self.__dbField("workTime")
+        return connector.getAggregate([f"SUM({workTimeField})", "COUNT(*)", f"MIN({workTimeField})",
+                                       f"MAX({workTimeField})"], condition, params)
+
+    # stats are dropped if next page is appended meanwhile
+    def __setUnloadedStats(self, pageAfter, stats):
+        if pageAfter == self.__pageAfter:
+            self.__unloadedStats = stats
+
+    def __rebuildAggregates(self):
+        self.__aggTotal = 0
+        self.__aggTasks = dict()
+        self.__aggSorted = []
+        self.__aggRunning = dict()
+        archived = [row for row in self.__filteredRows if type(row) is int]
+        if len(archived) == len(self.__archive):
+            workTimes = numpy.frombuffer(self.__archive.workTimes, dtype=numpy.int64) if len(archived) > 0 \
+                else numpy.zeros(0, dtype=numpy.int64)
+        else:
+            workTimes = self.__archive.workTimesAt(self.__archive.positions(archived))
+        self.__aggArchiveTotal = int(workTimes.sum())
+        self.__aggArchiveSorted = array("q", numpy.sort(workTimes).tobytes())
+        for task in self.__filteredRows:
+            if type(task) is int:
+                continue
+            taskId = self.__taskId(task)
+            closed = task.closedWorkTime
+            self.__aggTasks[taskId] = (closed, task.segmentStart)
+            self.__aggTotal += closed
+            if task.segmentStart is not None:
+                self.__aggRunning[taskId] = self.__aggTasks[taskId]
+            else:
+                self.__aggSorted.append((closed, taskId))
+        self.__aggSorted.sort()
+
+    # add task to aggregates or refresh its values
+    def __aggregateTask(self, task):
+        taskId = self.__taskId(task)
+        values = (task.closedWorkTime, task.segmentStart)
+        if self.__aggTasks.get(taskId) == values:
+            return
+        self.__unaggregateTask(taskId)
+        self.__aggTasks[taskId] = values
+        self.__aggTotal += values[0]
+        if values[1] is not None:
+            self.__aggRunning[taskId] = values
+        else:
+            bisect.insort(self.__aggSorted, (values[0], taskId))
+
+    def __unaggregateTask(self, taskId):
+        values = self.__aggTasks.pop(taskId, None)
+        if values is None:
+            return
+        self.__aggTotal -= values[0]
+        if values[1] is not None:
+            del self.__aggRunning[taskId]
+        else:
+            del self.__aggSorted[bisect.bisect_left(self.__aggSorted, (values[0], taskId))]
+
+    def __unaggregateArchived(self, workTime):
+        self.__aggArchiveTotal -= workTime
+        del self.__aggArchiveSorted[bisect.bisect_left(self.__aggArchiveSorted, workTime)]
+
+    # total, count, min and max work time of filtered tasks
+    def getWorkTimeStats(self):
+        now = int(time.time())
+        running = list(self.__aggRunning.values())
+        durations = [closed + now - segmentStart for closed, segmentStart in running]
+        if len(self.__aggSorted) > 0:
+            durations += [self.__aggSorted[0][0], self.__aggSorted[-1][0]]
+        if len(self.__aggArchiveSorted) > 0:
+            durations += [self.__aggArchiveSorted[0], self.__aggArchiveSorted[-1]]
+        total = self.__aggTotal + self.__aggArchiveTotal + sum(now - segmentStart for closed, segmentStart in running)
+        count = len(self.__aggTasks) + len(self.__aggArchiveSorted)
+        unloaded = self.__unloadedStats
+        if unloaded is not None and unloaded[1] > 0:  # paged mode: rows in database which are not loaded yet
+            total += unloaded[0]
+            count += unloaded[1]
+            durations += [unloaded[2], unloaded[3]]
+        return {"total": total,
+                "count": count,
+                "min": min(durations) if len(durations) > 0 else 0,
+                "max": max(durations) if len(durations) > 0 else 0}
+
     def getTotalWorkTime(self):
-        summTime=0
-        for task in self.__filteredList.values():
-            summTime +=task.workTime
-        return summTime
-        #return sum(self.__filteredList.values().workTime)
+        return self.getWorkTimeStats()["total"]
+
+    # return when worker wrote all submitted writes (before reading database)
+    def flush(self):
+        if self.__dbWorker is not None:
+            self.__dbWorker.wait()
+
+    # close open run segments and database (call on application exit)
+    def close(self):
+        for task in list(self.__taskList.values()):
+            if task.state == "RUN":  # close open run segments
+                task.pauseTask()
+        self.__scheduler.stop()
+        if self.__dbWorker is not None:
+            self.__dbWorker.stop()
+        if self.__journal is not None:  # all work time is in database
+            self.__journal.reset()
+            self.__journal.close()
+        self.__dBConnector.close()
+        if self.__archiveConnector is not None:
+            self.__archiveConnector.close()
+        if self.__segmentConnector is not None:
+            self.__segmentConnector.close()
+
+    # task notify taskStorage about change data which is not saved in database (running work time)
+    @countedCall("TaskStorage.notifyView")
+    def notifyView(self, object, propertyes):
+        if self.__journal is not None and "workTime" in propertyes:
+            self.__journalTick(object)
+        if self.__refresh is not None:
+            self.__refresh.markDirty(object, propertyes)  # applied in gui thread with other changes of frame
+        else:
+            self.__taskChanged(object, propertyes)  # refresh __filteredList and model
+
+    # append work time of running task since its previous record, compact journal when it is due
+    def __journalTick(self, task):
+        now = int(time.time())
+        with self.__journalLock:
+            entry = self.__journaled.get(task.taskId)
+            if entry is None or entry[0] is not task:
+                return
+            self.__journal.append(task.taskId, now, now - entry[1])
+            entry[1] = now
+            due = not self.__compacting and (self.__journal.records >= self.__compactRecords or
+                                             time.monotonic() - self.__lastCompaction >= self.__compactInterval)
+        if due:
+            self.compactJournal()
+
+    # write work time of running tasks to Task table and replace journal records by checkpoints
+    def compactJournal(self):
+        if self.__journal is None:
+            return
+        now = int(time.time())
+        workField = self.__dbField("workTime")
+        with self.__journalLock:
+            if self.__compacting:
+                return
+            self.__compacting = True
+            self.__lastCompaction = time.monotonic()
+            position = self.__journal.position
+            checkpoints = []
+            for taskId, entry in self.__journaled.items():
+                task = entry[0]
+                if task.segmentStart is not None:
+                    checkpoints.append((taskId, now, task.closedWorkTime + now - task.segmentStart))
+                    entry[1] = now
+        updates = [(taskId, {workField: workTime}) for taskId, timestamp, workTime in checkpoints]
+        # tasks are not read again if write fails, records of journal are kept until next compaction
+        self.__write([], self.__writeCheckpoint, updates, position, checkpoints)
+
+    # paused tasks are skipped, their work time is written by pause after compaction is started
+    def __writeCheckpoint(self, updates, position, checkpoints):
+        try:
+            # checkpoint is written after lock is released: task paused and started again meanwhile has greater work
+            # time in database, so work time is never lowered by checkpoint (?1 - first parameter, new work time)
+            workField = self.__dbField("workTime")
+            self.__dBConnector.updateManyById(updates, f"{self.__dbField('state')}='RUN' AND {workField} < ?1")
+            self.__journal.compact(position, checkpoints)
+        finally:
+            with self.__journalLock:
+                self.__compacting = False
 
     # task notify taskStorage about change data
+    @countedCall("TaskStorage.notify")
     def notify(self, object, propertyes):
         updates = dict()
         for property in propertyes:
-            if (hasattr(object, property)):
-                value = getattr(object, property)
-                # UPDATE query for database
-                for obj in self.__ormMapping:
-                    if obj.objectPropertyName == property:
-                        updates[obj.dbFieldName] = value
+            dbFieldName = self.__ormMapping.column(property)
+            if dbFieldName is not None and hasattr(object, property):
+                updates[dbFieldName] = getattr(object, property)  # UPDATE query for database
         if len(updates) > 0:
             if self.__primaryObj != None:
                 value = getattr(object, self.__primaryObj.objectPropertyName)
-                condition = f"{self.__primaryObj.dbFieldName}=\'{str(value)}\'"
-                self.__dBConnector.update(updates, condition)
-                if self.__applyedFilter != None:  # refresh __filteredList
-                    self.__applyFilter(self.__applyedFilter)
-                if self.__Model != None:  # refresh model
-                    self.__Model.dataChangedInternaly()
+                if self.__batchUpdates is not None:
+                    self.__batchUpdates.append((value, updates))
+                elif self.__archiveConnector is None:
+                    self.__write([value], self.__dBConnector.updateById, value, updates)
+                else:
+                    self.__writeUpdates([(value, updates)])
+                self.__taskChanged(object, propertyes)  # refresh __filteredList and model
+
+
+# Work time of finished tasks grouped by day, ISO week, month or task name
+# columns of finished tasks are read from database by load and kept in numpy arrays, groups are computed by bincount
+# timeZone - offset of local time in seconds, days are bounded as in date format of view
+class TaskReport:
+    # dbWorker - DBWorker of storage, rows are read by worker thread after queued writes of tasks
+    #            (None - rows are read in calling thread)
+    def __init__(self, dBConnector, ormMapping, timeZone=0, dbWorker=None):
+        self.__dBConnector = dBConnector
+        self.__ormMapping = OrmMapping(ormMapping)
+        self.__timeZone = int(timeZone)
+        self.__dbWorker = dbWorker
+        self.__dateEnd = numpy.zeros(0, dtype=numpy.int64)
+        self.__workTime = numpy.zeros(0, dtype=numpy.int64)
+        self.__nameCodes = numpy.zeros(0, dtype=numpy.int64)
+        self.__names = []
+
+    def __dbField(self, propertyName):
+        return self.__ormMapping.column(propertyName)
+
+    @property
+    def taskCount(self):
+        return len(self.__dateEnd)
+
+    # read finished tasks from database, callback() is called in gui thread when report is loaded
+    # error of worker is raised in gui thread
+    def load(self, callback=None):
+        if self.__dbWorker is None:
+            self.__apply(self.__read())
+            if callback is not None:
+                callback()
+            return
+
+        def complete(columns, error):
+            if error is not None:
+                raise error
+            self.__apply(columns)
+            if callback is not None:
+                callback()
+
+        self.__dbWorker.submit(self.__read, (), complete)
+
+    # (dateEnd, workTime, name codes, names), columns of chunks are converted by numpy, not by row
+    def __read(self):
+        dateEndField = self.__dbField("dateEnd")
+        dateEnds, workTimes, nameCodes = [], [], []
+        codes = dict()
+        for rows in self.__dBConnector.iterChunks(f"{self.__dbField('state')}='STOP' AND {dateEndField} IS NOT NULL",
+                                                  [dateEndField, self.__dbField("workTime"),
+                                                   self.__dbField("taskName")], chunkSize=100000):
+            dateEnd, workTime, names = zip(*rows)
+            dateEnds.append(numpy.array(dateEnd, dtype=numpy.float64).astype(numpy.int64))
+            workTimes.append(numpy.nan_to_num(numpy.array(workTime, dtype=numpy.float64)).astype(numpy.int64))
+            for name in dict.fromkeys(names):  # new names of chunk get codes in order of first row
+                if name not in codes:
+                    codes[name] = len(codes)
+            nameCodes.append(numpy.fromiter(map(codes.__getitem__, names), dtype=numpy.int64, count=len(names)))
+        empty = [numpy.zeros(0, dtype=numpy.int64)]
+        return numpy.concatenate(dateEnds or empty), numpy.concatenate(workTimes or empty), \
+            numpy.concatenate(nameCodes or empty), [str(name) for name in codes]
+
+    def __apply(self, columns):
+        self.__dateEnd, self.__workTime, self.__nameCodes, self.__names = columns
+
+    # [(group label, total work time, task count)], time groups are ordered by date, names by total work time
+    def totals(self, grouping):
+        if len(self.__dateEnd) == 0:
+            return []
+        if grouping == ReportGrouping.taskName:
+            return self.__groups(self.__nameCodes, lambda code: self.__names[code], True)
+        days = (self.__dateEnd + self.__timeZone) // 86400  # local days from 01-01-1970
+        if grouping == ReportGrouping.day:
+            return self.__groups(days, lambda day: self.__dayDate(day).strftime('%d-%m-%Y'))
+        if grouping == ReportGrouping.week:
+            thursdays = days - (days + 3) % 7 + 3  # ISO week and its year are given by thursday of week
+            return self.__groups(thursdays // 7, self.__weekLabel)
+        if grouping == ReportGrouping.month:
+            months = days.astype("datetime64[D]").astype("datetime64[M]").astype(numpy.int64)
+            return self.__groups(months, lambda month: f"{month % 12 + 1:02d}-{1970 + month // 12}")
+        raise ValueError("Not correct report grouping")
+
+    def __groups(self, keys, labelFunction, byTotal=False):
+        first = int(keys.min())
+        counts = numpy.bincount(keys - first)
+        totals = numpy.bincount(keys - first, weights=self.__workTime)
+        groups = numpy.flatnonzero(counts)
+        if byTotal:
+            groups = groups[numpy.argsort(-totals[groups], kind="stable")]
+        return [(labelFunction(int(group) + first), int(totals[group]), int(counts[group])) for group in groups]
+
+    def __dayDate(self, day):
+        return datetime.date(1970, 1, 1) + datetime.timedelta(days=day)
+
+    def __weekLabel(self, week):
+        isoYear, isoWeek, isoDay = self.__dayDate(week * 7).isocalendar()
+        return f"{isoYear}-W{isoWeek:02d}"
+
+
+# View of TaskReport groups: group label, task count and total work time
+class ReportModel(QAbstractTableModel):
+    headers = {ReportGrouping.day: "Day", ReportGrouping.week: "Week", ReportGrouping.month: "Month",
+               ReportGrouping.taskName: "Task Name"}
+
+    def __init__(self, taskReport, workTimeFormat=None):
+        super(ReportModel, self).__init__()
+        self.__taskReport = taskReport
+        self.__workTimeFormat = workTimeFormat
+        self.__grouping = ReportGrouping.day
+        self.__rows = []
+
+    @property
+    def grouping(self):
+        return self.__grouping
+
+    def rowCount(self, index=QModelIndex()):
+        return len(self.__rows)
+
+    def columnCount(self, index=QModelIndex()):
+        return 3
+
+    def setGrouping(self, grouping):
+        self.beginResetModel()
+        self.__grouping = grouping
+        self.__rows = self.__taskReport.totals(grouping)
+        self.endResetModel()
+
+    # read finished tasks again and show current grouping when they are loaded
+    def refresh(self):
+        self.__taskReport.load(lambda: self.setGrouping(self.__grouping))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self.__rows):
+            return None
+        if role == Qt.DisplayRole:
+            label, total, count = self.__rows[index.row()]
+            if index.column() == 0:
+                return label
+            if index.column() == 1:
+                return count
+            if index.column() == 2:
+                return self.__workTimeFormat(total) if self.__workTimeFormat is not None else total
+        return None
+
+    def headerData(self, p_int, orientation, role=None):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return (self.headers[self.__grouping], "Tasks", "Work Time")[p_int] if 0 <= p_int < 3 else None
+        return None
 
 
 class TaskModel(QAbstractTableModel):
 
-    def __init__(self, taskStorage, ormMapping, appendRow=0, buttonData=[], gui=None):
+    # cacheSize - count of tasks with cached display values and brushes
+    #             (None - all rows of model: rows of view or loaded pages, cache is cleared by filter change)
+    def __init__(self, taskStorage, ormMapping, appendRow=0, buttonData=[], gui=None, cacheSize=None,
+                 colorRules=defaultColorRules):
         super(TaskModel, self).__init__()
         self.__taskStorage = taskStorage
         self.__appendRow = appendRow
@@ -381,6 +2548,12 @@ class TaskModel(QAbstractTableModel):
         self.__ormMapping = ormMapping
         self.__appendData= []
         self.__gui = gui
+        self.__displayCache = OrderedDict()  # task id -> {column: formatted value}, least recently used first
+        self.__cacheSize = cacheSize
+        self.__cacheHits = 0
+        self.__cacheMisses = 0
+        self.__insertedRow = None
+        self.__colorRules = colorRules
         # create header sign
         self.__taskProp = list(filter(lambda x: x.viewMappingType == ViewMapping.SHOW and type(x.viewHeaderSign) == str,
                                       self.__ormMapping))
@@ -388,21 +2561,51 @@ class TaskModel(QAbstractTableModel):
     def setAppendData(self,  appendData=[]):
         self.__appendData = appendData
 
+    @property
+    def colorRules(self):
+        return self.__colorRules
+
+    @colorRules.setter
+    def colorRules(self, colorRules):
+        self.__colorRules = colorRules
+        for values in self.__displayCache.values():
+            values.pop(None, None)
+        if self.rowCount() > 0:
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, self.columnCount() - 1),
+                                  [Qt.BackgroundRole])
+
+    @property
+    def cacheHits(self):
+        return self.__cacheHits
+
+    @property
+    def cacheMisses(self):
+        return self.__cacheMisses
+
     def rowCount(self, index=QModelIndex()):
         return self.__taskStorage.getElementCount()+self.__appendRow
 
     def columnCount(self, index=QModelIndex()):
         return len(self.__taskProp) + len(self.__buttonData)  # task column + action buttons
 
+    # storage sends row changes to the model of current view
     def setAllTaskView(self):
+        self.__taskStorage.Model = self
         self.__taskStorage.viewActiveTask()
 
     def switchToAllDataView(self):
+            self.__taskStorage.Model = self
             self.__taskStorage.viewAllFinishedTask()
 
     def switchToFilterData(self, dateStart, dateEnd):
+            self.__taskStorage.Model = self
             self.__taskStorage.viewFinishedTaskBetweenDate(dateStart, dateEnd)
 
+    def switchToMatchingData(self, query, finished=None):
+        self.__taskStorage.Model = self
+        self.__taskStorage.viewTasksMatching(query, finished)
+
+    @countedCall("TaskModel.data")
     def data(self, index, role=Qt.DisplayRole):
         if not index.isValid():
             return None
@@ -419,32 +2622,70 @@ class TaskModel(QAbstractTableModel):
 
         i = index.row()
         j = index.column()
-        task = self.__taskStorage.getTaskByNum(i)  # get task from storage
         if role == Qt.DisplayRole:
             if (j < len(self.__taskProp)):
-                value = getattr(task, self.__taskProp[j].objectPropertyName, None)
-                if (self.__taskProp[j].formatFunction != None):  # apply format function
-                    func = self.__taskProp[j].formatFunction
-                    value = func(value)
-                return value
+                return self.__displayValue(i, j)  # task is read from storage only if value is not cached
             elif len(self.__taskProp) <= j < len(self.__taskProp) + len(self.__buttonData):
                 return self.__buttonData[j - len(self.__taskProp)]
         if role == Qt.BackgroundRole:
-            # colorBindings
-            propetyColor = colorBindings[0]  # header for change color
-            defaultColor = colorBindings[1]  #
-            dictColors = dict()
-            for color in colorBindings:
-                if type(color) is tuple:
-                    dictColors[color[0]] = color[1]
-
-            for key in dictColors.keys():
-                if hasattr(task, propetyColor):
-                    if getattr(task, propetyColor, None) == key:
-                        return dictColors[key]
-            return defaultColor
+            return self.__rowBrush(i)
         return None
 
+    # cached values of task: {column: formatted value, None: (brush, time when brush expires)}
+    def __cachedValues(self, taskId):
+        values = self.__displayCache.get(taskId)
+        if values is None:
+            values = dict()
+            self.__displayCache[taskId] = values
+            cacheSize = self.__cacheSize if self.__cacheSize is not None else self.rowCount()
+            if len(self.__displayCache) > max(cacheSize, 1):
+                self.__displayCache.popitem(last=False)
+        else:
+            self.__displayCache.move_to_end(taskId)
+        return values
+
+    # background of row by color rules, rules are evaluated again after change of task or expiry by age
+    def __rowBrush(self, row):
+        values = self.__cachedValues(self.__taskStorage.getTaskIdByNum(row))
+        cached = values.get(None)
+        if cached is not None and (cached[1] is None or time.time() < cached[1]):
+            self.__cacheHits += 1
+            return cached[0]
+        self.__cacheMisses += 1
+        task = self.__taskStorage.getTaskByNum(row)  # get task from storage
+        cached = self.__colorRules.brush(task, int(time.time()))
+        values[None] = cached
+        return cached[0]
+
+    # formatted value of task property, format function is called again only after notify about change of property
+    def __displayValue(self, row, column):
+        values = self.__cachedValues(self.__taskStorage.getTaskIdByNum(row))
+        if column in values:
+            self.__cacheHits += 1
+            return values[column]
+        self.__cacheMisses += 1
+        task = self.__taskStorage.getTaskByNum(row)  # get task from storage
+        value = getattr(task, self.__taskProp[column].objectPropertyName, None)
+        if (self.__taskProp[column].formatFunction != None):  # apply format function
+            func = self.__taskProp[column].formatFunction
+            value = func(value)
+        values[column] = value
+        return value
+
+    # drop cached display values of task in row (all values if propertyes is None)
+    def __invalidateRow(self, row, propertyes=None):
+        taskId = self.__taskStorage.getTaskIdByNum(row)
+        if propertyes is None:
+            self.__displayCache.pop(taskId, None)
+            return
+        values = self.__displayCache.get(taskId)
+        if values is not None:
+            for column, prop in enumerate(self.__taskProp):
+                if prop.objectPropertyName in propertyes:
+                    values.pop(column, None)
+            if any(prop in propertyes for prop in self.__colorRules.properties):
+                values.pop(None, None)
+
     def headerData(self, p_int, orientation, role=None):
         if role != Qt.DisplayRole:
             return None
@@ -454,6 +2695,7 @@ class TaskModel(QAbstractTableModel):
                 return self.__taskProp[p_int].viewHeaderSign
         return None
 
+    @countedCall("TaskModel.layoutChange")
     def update(self):
         if self.__gui is not None:
             self.__gui.updateView()
@@ -461,12 +2703,68 @@ class TaskModel(QAbstractTableModel):
             self.layoutAboutToBeChanged.emit()
             self.layoutChanged.emit()
 
+    @countedCall("TaskModel.layoutChange")
     def refresh(self):
         self.layoutAboutToBeChanged.emit()
         self.layoutChanged.emit()
 
-    def dataChangedInternaly(self):
-        self.dataChanged.emit(QModelIndex, QModelIndex, (Qt.BackgroundRole or Qt.DisplayRole))
+    # task in row changed: only cells of changed properties are repainted
+    # state changes background and buttons of all row
+    def taskChanged(self, row, propertyes):
+        self.tasksChanged([row], propertyes)
+
+    # tasks in rows changed: one dataChanged from first to last changed row
+    def tasksChanged(self, rows, propertyes):
+        for row in rows:
+            self.__invalidateRow(row, propertyes)
+        if "state" in propertyes:
+            columns = [0, self.columnCount() - 1]
+        else:
+            columns = [col for col, prop in enumerate(self.__taskProp) if prop.objectPropertyName in propertyes]
+        if len(columns) > 0:
+            self.dataChanged.emit(self.index(min(rows), min(columns)), self.index(max(rows), max(columns)),
+                                  [Qt.DisplayRole, Qt.BackgroundRole])
+        if "workTime" in propertyes:  # total row
+            for data in self.__appendData:
+                index = self.index(data.rowNum - 1, data.colNum)
+                self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+    def beginInsertTask(self, row):
+        self.__insertedRow = row
+        self.beginInsertRows(QModelIndex(), row, row)
+
+    def endInsertTask(self):
+        self.__invalidateRow(self.__insertedRow)  # task could be changed while it was filtered out
+        self.endInsertRows()
+
+    def beginAppendTasks(self, first, last):
+        self.beginInsertRows(QModelIndex(), first, last)
+
+    def endAppendTasks(self):
+        self.endInsertRows()
+
+    # paged mode: rows are read from database when view is scrolled to the end
+    def canFetchMore(self, parent=QModelIndex()):
+        return self.__taskStorage.canFetchMore()
+
+    def fetchMore(self, parent=QModelIndex()):
+        self.__taskStorage.fetchMore()
+
+    def beginRemoveTask(self, row):
+        self.__invalidateRow(row)
+        self.beginRemoveRows(QModelIndex(), row, row)
+
+    def endRemoveTask(self):
+        self.endRemoveRows()
+
+    # all rows are changed by new filter
+    @countedCall("TaskModel.reset")
+    def beginFilterChange(self):
+        self.__displayCache.clear()  # tasks could be changed while model was not attached to storage
+        self.beginResetModel()
+
+    def endFilterChange(self):
+        self.endResetModel()
 
     # get clicked task id for delegate
     def getClickedTaskId(self, idsPropertyName, rowNum):
@@ -582,7 +2880,6 @@ class FinishButtonDelegate(QStyledItemDelegate):
             else:
                 self._pressed = (index.row(), index.column())
                 task.stopTask()
-                model.update()
             return True
         elif event.type() == QEvent.MouseButtonRelease:
             return True
@@ -623,10 +2920,8 @@ class DeleteButtonDelegate(QStyledItemDelegate):
                     confirm = QMessageBox.question(self.__gui, "Delete confimation", "Task will be deleted. Are you sure you want to do it?", QMessageBox.Yes, QMessageBox.No)
                     if confirm == QMessageBox.Yes:
                         self.__taskStorage.deleteTask(id)
-                        model.update()
                 else:
                     self.__taskStorage.deleteTask(id)
-                    model.update()
             return True
         elif event.type() == QEvent.MouseButtonRelease:
             return True
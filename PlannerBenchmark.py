@@ -0,0 +1,1013 @@
+# Headless benchmarks and consistency checks of storage, model and delegates
+# python PlannerBenchmark.py [--quick] [--only name,...] [--output results.json] [--baseline old.json]
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")  # no display is needed
+import PySide2
+from PySide2.QtCore import Qt, QRect, QTimer, qVersion
+from PySide2.QtGui import QBrush, QImage, QPainter
+from PySide2.QtWidgets import QApplication, QTableView, QStyleOptionViewItem
+import ClassesPlanner as cPl
+from TimePlanner import ormMapping, ormMappingSegment, buttonData, TimeZone
+
+
+# Run func count times and return latency statistics in microseconds
+def measure(name, func, count):
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        func(i)
+        timings.append((time.perf_counter() - start) * 1000000)
+    timings.sort()
+    return {"name": name, "count": count,
+            "mean_us": round(sum(timings) / count, 2),
+            "p50_us": round(timings[count // 2], 2),
+            "p99_us": round(timings[min(count - 1, int(count * 0.99))], 2)}
+
+
+# Latency of DBConnector add/update/updateById/getData/deleteById
+# persistent=False reproduces the old connect-per-call behaviour
+def benchDBConnector(count=500):
+    results = []
+    for persistent, pragmas in ((False, None), (True, cPl.defaultPragmas)):
+        mode = "persistent" if persistent else "connect-per-call"
+        with tempfile.TemporaryDirectory() as tmpDir:
+            db = cPl.DBConnector(os.path.join(tmpDir, "bench.db"), "Task", ormMapping, pragmas, persistent)
+            fields = ["Name", "DateStart", "State", "WorkTime"]
+            ids = []
+            results.append(measure(f"DBConnector.add [{mode}]",
+                                   lambda i: ids.append(db.add(fields, [f"task {i}", int(time.time()), "", 0])),
+                                   count))
+            results.append(measure(f"DBConnector.update [{mode}]",
+                                   lambda i: db.update({"WorkTime": i}, f"id='{ids[i]}'"), count))
+            results.append(measure(f"DBConnector.updateById [{mode}]",
+                                   lambda i: db.updateById(ids[i], {"WorkTime": i}), count))
+            results.append(measure(f"DBConnector.getData [{mode}]",
+                                   lambda i: db.getData(f"id={ids[i]}", ["id", "Name"]), count))
+            results.append(measure(f"DBConnector.deleteById [{mode}]",
+                                   lambda i: db.deleteById(ids[i]), count))
+            db.close()
+    return results
+
+
+# TaskStorage.notifyView of running work time (tick, no SQL) and notify of changed state (one UPDATE)
+def benchNotify(taskCount=1000, count=20):
+    with tempfile.TemporaryDirectory() as tmpDir:
+        storage = createStorage(os.path.join(tmpDir, "bench.db"), taskCount)
+        tasks = [storage.getTaskByNum(row) for row in range(storage.getElementCount())]
+        results = [measure("TaskStorage.notifyView [workTime]",
+                           lambda i: storage.notifyView(tasks[i % len(tasks)], ["workTime"]), taskCount * count),
+                   measure("TaskStorage.notify [state]",
+                           lambda i: storage.notify(tasks[i % len(tasks)], ["state"]), taskCount)]
+        storage.close()
+    return results
+
+
+# Observer without database for scheduler stress test
+class TickCounter:
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.ticks = 0
+
+    def notify(self, task, propertyes):
+        pass
+
+    def notifyView(self, task, propertyes):
+        self.ticks += 1
+
+    def openSegment(self, task, segmentStart):
+        return -1
+
+    def closeSegment(self, task, segmentId, segmentEnd):
+        pass
+
+
+# taskCount running tasks ticked by one TaskScheduler: thread count and CPU time
+def benchScheduler(taskCount=1000, period=0.05, duration=2.0):
+    threadsBefore = threading.active_count()
+    observer = TickCounter(cPl.TaskScheduler(period))
+    tasks = [cPl.Task(f"task {i}", int(time.time()), 0, observer) for i in range(taskCount)]
+    cpuStart = time.process_time()
+    wallStart = time.perf_counter()
+    for task in tasks:
+        task.startTask()
+    time.sleep(duration)
+    threadsRunning = threading.active_count()
+    for task in tasks:
+        task.pauseTask()
+    cpu = time.process_time() - cpuStart
+    wall = time.perf_counter() - wallStart
+    observer.scheduler.stop()
+    return [{"name": f"TaskScheduler [{taskCount} running tasks]",
+             "threads_before": threadsBefore, "threads_running": threadsRunning,
+             "ticks": observer.ticks, "expected_ticks": int(taskCount * duration / period),
+             "cpu_s": round(cpu, 3), "cpu_percent": round(cpu / wall * 100, 1)}]
+
+
+# taskCount running tasks ticked every period with model attached: dataChanged signals per second and CPU time
+# with every tick sent to model and with ticks coalesced at frameRate
+def benchRefreshCoalescer(taskCounts=(10, 100, 1000), period=0.05, duration=1.0, frameRate=30):
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    for taskCount in taskCounts:
+        for rate in (None, frameRate):
+            mode = f"{rate} Hz coalescer" if rate is not None else "every tick"
+            with tempfile.TemporaryDirectory() as tmpDir:
+                storage = cPl.TaskStorage(cPl.DBConnector(os.path.join(tmpDir, "bench.db"), "Task", ormMapping),
+                                          ormMapping, scheduler=cPl.TaskScheduler(period), frameRate=rate)
+                model = cPl.TaskModel(storage, ormMapping, 0, buttonData)
+                model.setAllTaskView()
+                storage.addTasks([f"task {i}" for i in range(taskCount)])
+                for row in range(taskCount):
+                    storage.getTaskByNum(row).startTask()
+                signals = []
+                model.dataChanged.connect(lambda *args: signals.append(1))
+                cpuStart = time.process_time()
+                QTimer.singleShot(int(duration * 1000), app.quit)
+                app.exec_()
+                cpu = time.process_time() - cpuStart
+                results.append({"name": f"model refresh [{taskCount} running tasks, {mode}]",
+                                "signals_per_s": round(len(signals) / duration, 1),
+                                "cpu_percent": round(cpu / duration * 100, 1)})
+                storage.close()
+    return results
+
+
+# TaskStorage with taskCount active tasks in database dbPath
+# archive - finished tasks are moved to TaskArchive table, worker - writes and paged reads are executed by DBWorker
+def createStorage(dbPath, taskCount, pageSize=None, archive=False, worker=False):
+    archiveConnector = cPl.DBConnector(dbPath, "TaskArchive", ormMapping) if archive else None
+    storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping, pageSize=pageSize,
+                              archiveConnector=archiveConnector, dbWorker=cPl.DBWorker() if worker else None)
+    storage.clearFilter()
+    for i in range(taskCount):
+        storage.addTask(f"task {i}")
+    storage.viewActiveTask()
+    return storage
+
+
+# read all pages of paged filter, reads of worker are applied by events of gui thread
+def fetchAll(storage):
+    app = QApplication.instance()
+    while True:
+        if app is not None:
+            storage.flush()
+            app.processEvents()
+        if not storage.canFetchMore():
+            return
+        storage.fetchMore()
+
+
+# TaskModel.data over all cells and offscreen QTableView repaint at several scroll positions
+def benchTableView(rowCount=50000):
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    with tempfile.TemporaryDirectory() as tmpDir:
+        storage = createStorage(os.path.join(tmpDir, "bench.db"), rowCount)
+        model = cPl.TaskModel(storage, ormMapping, 0, buttonData)
+        storage.Model = model
+        view = QTableView()
+        view.setModel(model)
+        delegates = [cPl.StartButtonDelegate(storage, "taskId"), cPl.PauseButtonDelegate(storage, "taskId"),
+                     cPl.FinishButtonDelegate(storage, "taskId"), cPl.DeleteButtonDelegate(storage, "taskId")]
+        for column, delegate in enumerate(delegates):
+            view.setItemDelegateForColumn(model.getHeaderLenght() + column, delegate)
+        view.resize(1100, 800)
+        view.show()
+        columnCount = model.columnCount()
+
+        def scan(i):
+            for row in range(model.rowCount()):
+                for column in range(columnCount):
+                    model.data(model.index(row, column))
+
+        results.append(measure(f"TaskModel.data full scan [{rowCount} rows]", scan, 3))
+        results[-1]["cache_hits"] = model.cacheHits
+        results[-1]["cache_misses"] = model.cacheMisses
+
+        def scanBackground(i):
+            for row in range(model.rowCount()):
+                for column in range(columnCount):
+                    model.data(model.index(row, column), Qt.BackgroundRole)
+
+        results.append(measure(f"TaskModel.data BackgroundRole scan [{rowCount} rows]", scanBackground, 3))
+        positions = list(range(0, rowCount, max(1, rowCount // 20)))
+
+        def render(i):
+            view.scrollTo(model.index(positions[i], 0))
+            view.viewport().grab()
+
+        results.append(measure(f"QTableView repaint [{rowCount} rows]", render, len(positions)))
+        results.append(measure(f"QTableView repaint again [{rowCount} rows]", render, len(positions)))
+        view.close()
+        storage.close()
+    return results
+
+
+# TaskModel.data of archive view with archiveCount rows (display cache) and
+# StartButtonDelegate/DeleteButtonDelegate paint of button cells into QImage
+def benchDelegates(rowCount=1000, archiveCount=100000):
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    # archive view scrolled to the end and back: display values of all loaded pages stay cached
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbPath = os.path.join(tmpDir, "bench.db")
+        fillFinishedTasks(dbPath, archiveCount)
+        storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping, pageSize=200)
+        model = cPl.TaskModel(storage, ormMapping, 0, buttonData)
+        model.switchToAllDataView()
+        while model.canFetchMore():
+            model.fetchMore()
+        indexes = [model.index(row, 0) for row in range(model.rowCount())]
+        for scroll, scrolled in (("first", indexes), ("back", indexes[::-1])):
+            hits, misses = model.cacheHits, model.cacheMisses
+            start = time.perf_counter()
+            for index in scrolled:
+                model.data(index)
+            results.append({"name": f"TaskModel.data [{len(indexes)} archive rows, {scroll} scroll]",
+                            "wall_ms": round((time.perf_counter() - start) * 1000, 2),
+                            "cache_hits": model.cacheHits - hits, "cache_misses": model.cacheMisses - misses})
+        storage.close()
+        if results[-1]["cache_misses"] != 0:
+            raise AssertionError(f"{results[-1]['cache_misses']} rows of archive view are evicted from cache")
+    with tempfile.TemporaryDirectory() as tmpDir:
+        storage = createStorage(os.path.join(tmpDir, "bench.db"), rowCount)
+        model = cPl.TaskModel(storage, ormMapping, 0, buttonData)
+        storage.Model = model
+        image = QImage(100, 30, QImage.Format_ARGB32)
+        painter = QPainter(image)
+        option = QStyleOptionViewItem()
+        option.rect = QRect(0, 0, 100, 30)
+        delegates = (("StartButtonDelegate", cPl.StartButtonDelegate(storage, "taskId"), 0),
+                     ("DeleteButtonDelegate", cPl.DeleteButtonDelegate(storage, "taskId"), 3))
+        try:
+            for name, delegate, button in delegates:
+                indexes = [model.index(row, model.getHeaderLenght() + button) for row in range(rowCount)]
+                results.append(measure(f"{name}.paint [QImage]",
+                                       lambda i: delegate.paint(painter, option, indexes[i % rowCount]), rowCount))
+        finally:
+            painter.end()
+            storage.close()
+    return results
+
+
+# TaskStorage view switches over taskCount tasks (10% active), all tasks loaded and paged
+def benchFilters(taskCount=100000, count=20):
+    results = []
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbPath = os.path.join(tmpDir, "bench.db")
+        endTime = fillFinishedTasks(dbPath, taskCount - taskCount // 10)
+        db = cPl.DBConnector(dbPath, "Task", ormMapping)
+        db.addMany(["Name", "DateStart", "State", "WorkTime"],
+                   [[f"active {i}", int(time.time()), "PAUSED", 0] for i in range(taskCount // 10)])
+        db.close()
+        views = (("viewActiveTask", lambda storage: storage.viewActiveTask()),
+                 ("viewAllFinishedTask", lambda storage: storage.viewAllFinishedTask()),
+                 ("viewFinishedTaskBetweenDate", lambda storage: storage.viewFinishedTaskBetweenDate(
+                     endTime - 86400, endTime - 86400)),
+                 ("clearFilter", lambda storage: storage.clearFilter()))
+        for pageSize in (None, 200):
+            storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping, pageSize=pageSize)
+            mode = "all tasks" if pageSize is None else f"paged {pageSize}"
+            for name, view in views:
+                result = measure(f"TaskStorage.{name} [{taskCount} tasks, {mode}]", lambda i: view(storage), count)
+                result["rows"] = storage.getElementCount()
+                results.append(result)
+            storage.close()
+    return results
+
+
+# Fill database with taskCount finished tasks, one task per minute ending at endTime
+def fillFinishedTasks(dbPath, taskCount, endTime=None):
+    endTime = endTime if endTime is not None else int(time.time())
+    db = cPl.DBConnector(dbPath, "Task", ormMapping, indexFields=("DateEnd",))
+    rows = []
+    for i in range(taskCount):
+        dateEnd = endTime - (taskCount - i) * 60
+        rows.append([f"archived {i % 1000}", dateEnd - 1800, dateEnd, "STOP", 1800])
+    db.addMany(["Name", "DateStart", "DateEnd", "State", "WorkTime"], rows)
+    db.close()
+    return endTime
+
+
+# viewFinishedTaskBetweenDate over taskCount archived tasks, one day range
+def benchDateRange(taskCount=1000000, count=200):
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbPath = os.path.join(tmpDir, "bench.db")
+        endTime = fillFinishedTasks(dbPath, taskCount)
+        storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping)
+        firstDay = endTime - taskCount * 60
+        days = max(1, taskCount * 60 // 86400)
+        result = measure(f"TaskStorage.viewFinishedTaskBetweenDate [{taskCount} tasks]",
+                         lambda i: storage.viewFinishedTaskBetweenDate(firstDay + (i % days) * 86400,
+                                                                       firstDay + (i % days) * 86400), count)
+        result["rows"] = storage.getElementCount()
+        storage.close()
+    return [result]
+
+
+# viewTasksMatching over taskCount archived tasks (1000 distinct names): full-text index build and search latency
+def benchSearch(taskCount=1000000, count=20):
+    results = []
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbPath = os.path.join(tmpDir, "bench.db")
+        fillFinishedTasks(dbPath, taskCount)
+        start = time.perf_counter()
+        cPl.DBConnector(dbPath, "Task", ormMapping, ftsFields=("Name",)).close()  # index of existing rows
+        results.append({"name": f"FTS5 index build [{taskCount} tasks]",
+                        "wall_s": round(time.perf_counter() - start, 3)})
+        queries = ("archived 123", "archived 12", "archived 9")
+        for pageSize in (None, 200):
+            storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping, ftsFields=("Name",)), ormMapping,
+                                      pageSize=pageSize)
+            mode = "all tasks" if pageSize is None else f"paged {pageSize}"
+            for query in queries:
+                result = measure(f"TaskStorage.viewTasksMatching '{query}' [{taskCount} tasks, {mode}]",
+                                 lambda i: storage.viewTasksMatching(query, True), count)
+                result["rows"] = storage.getElementCount()
+                results.append(result)
+            storage.close()
+    return results
+
+
+# Work time aggregates computed over all rows
+def workTimeStats(rows):
+    durations = [task.workTime for task in rows]
+    return {"total": sum(durations), "count": len(durations),
+            "min": min(durations) if len(durations) > 0 else 0,
+            "max": max(durations) if len(durations) > 0 else 0}
+
+
+# TaskStorage startup over taskCount tasks (10% active, half of them left running): wall time and peak memory
+def benchStartup(taskCounts=(10000, 100000, 1000000)):
+    results = []
+    for taskCount in taskCounts:
+        with tempfile.TemporaryDirectory() as tmpDir:
+            dbPath = os.path.join(tmpDir, "bench.db")
+            fillFinishedTasks(dbPath, taskCount - taskCount // 10)
+            db = cPl.DBConnector(dbPath, "Task", ormMapping)
+            db.addMany(["Name", "DateStart", "State", "WorkTime"],
+                       [[f"active {i}", int(time.time()), "RUN" if i % 2 else "", 0] for i in range(taskCount // 10)])
+            db.close()
+            for pageSize in (None, 200):
+                start = time.perf_counter()
+                storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping, pageSize=pageSize)
+                wall = time.perf_counter() - start
+                storage.close()
+                del storage
+                tracemalloc.start()
+                storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping, pageSize=pageSize)
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                storage.close()
+                del storage
+                mode = "all tasks" if pageSize is None else f"paged {pageSize}"
+                results.append({"name": f"TaskStorage startup [{taskCount} tasks, {mode}]",
+                                "wall_s": round(wall, 3), "peak_mb": round(peak / 1048576, 1),
+                                "retained_mb": round(current / 1048576, 1)})
+            # first start moves finished tasks to archive table, next starts read only active tasks
+            for name in ("migration to archive table", "startup"):
+                start = time.perf_counter()
+                storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping, pageSize=200,
+                                          archiveConnector=cPl.DBConnector(dbPath, "TaskArchive", ormMapping,
+                                                                           indexFields=("DateEnd",)))
+                results.append({"name": f"TaskStorage {name} [{taskCount} tasks, paged 200, archive table]",
+                                "wall_s": round(time.perf_counter() - start, 3)})
+                storage.close()
+    return results
+
+
+# addTask/stopTask/deleteTask for each of batch tasks against addTasks/stopTasks/deleteTasks
+# storage keeps taskCount finished tasks, signals of attached model are counted
+def benchBulkOperations(taskCount=100000, batch=500):
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    for bulk in (False, True):
+        mode = "bulk" if bulk else "one by one"
+        with tempfile.TemporaryDirectory() as tmpDir:
+            dbPath = os.path.join(tmpDir, "bench.db")
+            fillFinishedTasks(dbPath, taskCount)
+            storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping,
+                                      segmentConnector=cPl.DBConnector(dbPath, "TaskSegment", ormMappingSegment,
+                                                                         indexFields=("TaskId",)))
+            model = cPl.TaskModel(storage, ormMapping, 0, buttonData)
+            model.setAllTaskView()
+            signals = []
+            for signal in (model.rowsInserted, model.rowsRemoved, model.modelReset, model.dataChanged):
+                signal.connect(lambda *args: signals.append(1))
+            names = [f"bulk {i}" for i in range(batch)]
+            operations = (("add", lambda ids: storage.addTasks(names) if bulk else
+                           [storage.addTask(name) for name in names]),
+                          ("stop", lambda ids: storage.stopTasks(ids) if bulk else
+                           [storage.getTaskFromId(taskId).stopTask() for taskId in ids]),
+                          ("delete", lambda ids: storage.deleteTasks(ids) if bulk else
+                           [storage.deleteTask(taskId) for taskId in ids]))
+            ids = []
+            for name, operation in operations:
+                if name == "stop":
+                    ids = [storage.getTaskIdByNum(row) for row in range(storage.getElementCount())]
+                    for taskId in ids:  # stopped tasks close their run segments
+                        storage.getTaskFromId(taskId).startTask()
+                elif name == "delete":
+                    model.switchToAllDataView()
+                signals.clear()
+                start = time.perf_counter()
+                operation(ids)
+                results.append({"name": f"TaskStorage.{name} [{batch} of {taskCount} tasks, {mode}]",
+                                "wall_ms": round((time.perf_counter() - start) * 1000, 2),
+                                "model_signals": len(signals)})
+            storage.close()
+    return results
+
+
+# Latency of clicks in gui thread (addTask, startTask + pauseTask, deleteTask) with writes in calling thread and
+# with DBWorker, synchronous=FULL makes commit wait for disk like on a slow drive
+def benchDBWorker(count=200):
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    pragmas = (("journal_mode", "WAL"), ("synchronous", "FULL"))
+    for useWorker in (False, True):
+        mode = "DBWorker" if useWorker else "calling thread"
+        with tempfile.TemporaryDirectory() as tmpDir:
+            dbPath = os.path.join(tmpDir, "bench.db")
+            worker = cPl.DBWorker() if useWorker else None
+            storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping, pragmas), ormMapping,
+                                      segmentConnector=cPl.DBConnector(dbPath, "TaskSegment", ormMappingSegment,
+                                                                       pragmas, indexFields=("TaskId",)),
+                                      dbWorker=worker)
+            results.append(measure(f"TaskStorage.addTask [{mode}]", lambda i: storage.addTask(f"task {i}"), count))
+            tasks = [storage.getTaskByNum(row) for row in range(count)]
+            results.append(measure(f"Task.startTask + pauseTask [{mode}]",
+                                   lambda i: (tasks[i].startTask(), tasks[i].pauseTask()), count))
+            results.append(measure(f"TaskStorage.deleteTask [{mode}]",
+                                   lambda i: storage.deleteTask(tasks[i].taskId), count))
+            start = time.perf_counter()
+            storage.flush()
+            results.append({"name": f"written by worker after clicks [{mode}]",
+                            "wall_ms": round((time.perf_counter() - start) * 1000, 2)})
+            app.processEvents()  # confirmations of worker
+            storage.close()
+    return results
+
+
+# Tick of running task: work time written to Task table by UPDATE against record appended to TickJournal,
+# compaction of journal into Task table and replay of uncompacted journal at start
+def benchTickJournal(taskCount=1000, count=20000):
+    results = []
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbPath = os.path.join(tmpDir, "bench.db")
+        journalPath = os.path.join(tmpDir, "bench.journal")
+        storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping, journalPath=journalPath,
+                                  compactRecords=count * 2)
+        storage.addTasks([f"task {i}" for i in range(taskCount)])
+        tasks = [storage.getTaskByNum(row) for row in range(storage.getElementCount())]
+        for task in tasks:
+            task.startTask()
+        db = cPl.DBConnector(dbPath, "Task", ormMapping)
+        results.append(measure("tick written by DBConnector.updateById",
+                               lambda i: db.updateById(tasks[i % taskCount].taskId, {"WorkTime": i}), count))
+        results.append(measure("tick appended to TickJournal [TaskStorage.notifyView]",
+                               lambda i: storage.notifyView(tasks[i % taskCount], ["workTime"]), count))
+        results.append(measure(f"TaskStorage.compactJournal [{taskCount} running tasks]",
+                               lambda i: storage.compactJournal(), 5))
+        for i in range(count):
+            storage.notifyView(tasks[i % taskCount], ["workTime"])
+        storage.scheduler.stop()  # crash: journal is not reset by close
+        start = time.perf_counter()
+        cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping, journalPath=journalPath).close()
+        results.append({"name": f"TaskStorage start with journal replay [{count + taskCount} records]",
+                        "wall_ms": round((time.perf_counter() - start) * 1000, 2)})
+        db.close()
+    return results
+
+
+# TaskReport over taskCount finished tasks: load from database and grouped totals
+def benchReports(taskCount=2000000, count=20):
+    results = []
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbPath = os.path.join(tmpDir, "bench.db")
+        fillFinishedTasks(dbPath, taskCount)
+        db = cPl.DBConnector(dbPath, "Task", ormMapping)
+        report = cPl.TaskReport(db, ormMapping, TimeZone)
+        start = time.perf_counter()
+        report.load()
+        results.append({"name": f"TaskReport.load [{taskCount} tasks]", "wall_s": round(time.perf_counter() - start, 3)})
+        # load by worker: gui thread is blocked only by submit and by grouping of loaded rows
+        app = QApplication.instance() or QApplication(sys.argv)
+        worker = cPl.DBWorker()
+        workerReport = cPl.TaskReport(db, ormMapping, TimeZone, dbWorker=worker)
+        model = cPl.ReportModel(workerReport)
+        start = time.perf_counter()
+        model.refresh()
+        blocked = time.perf_counter() - start
+        while model.rowCount() == 0:
+            worker.wait()
+            app.processEvents()
+        wall = time.perf_counter() - start
+        worker.stop()
+        if workerReport.taskCount != report.taskCount:
+            raise AssertionError(f"worker loaded {workerReport.taskCount} of {report.taskCount} tasks")
+        results.append({"name": f"TaskReport.load [{taskCount} tasks, DBWorker]", "wall_s": round(wall, 3),
+                        "gui_blocked_ms": round(blocked * 1000, 2)})
+        for grouping, name in ((cPl.ReportGrouping.day, "day"), (cPl.ReportGrouping.week, "week"),
+                               (cPl.ReportGrouping.month, "month"), (cPl.ReportGrouping.taskName, "task name")):
+            result = measure(f"TaskReport.totals by {name} [{taskCount} tasks]", lambda i: report.totals(grouping),
+                             count)
+            result["groups"] = len(report.totals(grouping))
+            results.append(result)
+        db.close()
+    return results
+
+
+# Memory retained by TaskStorage with all tasks loaded (finished tasks are kept in columns)
+def benchMemory(taskCount=1000000):
+    results = []
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbPath = os.path.join(tmpDir, "bench.db")
+        fillFinishedTasks(dbPath, taskCount)
+        tracemalloc.start()
+        storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping)
+        startup = tracemalloc.get_traced_memory()[0]
+        storage.viewAllFinishedTask()
+        finished = tracemalloc.get_traced_memory()[0]
+        task = storage.getTaskByNum(0)
+        taskSize = tracemalloc.get_traced_memory()[0] - finished
+        tracemalloc.stop()
+        results.append({"name": f"TaskStorage memory [{taskCount} finished tasks]",
+                        "startup_bytes_per_task": round(startup / taskCount, 1),
+                        "finished_view_bytes_per_task": round(finished / taskCount, 1),
+                        "materialized_task_bytes": taskSize, "task_slots": hasattr(task, "__dict__") is False})
+        storage.close()
+    return results
+
+
+# Paged storage (finished tasks read by fetchMore) must show the same rows and aggregates as storage
+# with all tasks loaded
+def checkPagedArchive(taskCount=2500, pageSize=200):
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbPath = os.path.join(tmpDir, "check.db")
+        endTime = fillFinishedTasks(dbPath, taskCount)
+        full = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping)
+        paged = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping, pageSize=pageSize)
+        views = (lambda storage: storage.viewAllFinishedTask(),
+                 lambda storage: storage.viewFinishedTaskBetweenDate(endTime - 86400 * 2, endTime - 86400))
+        for view in views:
+            view(full)
+            view(paged)
+            if paged.getWorkTimeStats() != full.getWorkTimeStats():
+                raise AssertionError("paged aggregates differ before fetch")
+            pages = 0
+            while paged.canFetchMore():
+                paged.fetchMore()
+                pages += 1
+                if paged.getWorkTimeStats() != full.getWorkTimeStats():
+                    raise AssertionError(f"paged aggregates differ after page {pages}")
+            fullIds = [full.getTaskByNum(row).taskId for row in range(full.getElementCount())]
+            pagedIds = [paged.getTaskByNum(row).taskId for row in range(paged.getElementCount())]
+            if fullIds != pagedIds:
+                raise AssertionError("paged rows differ from loaded rows")
+        full.close()
+        paged.close()
+    return [{"name": "TaskStorage paged archive check", "tasks": taskCount, "pageSize": pageSize, "result": "ok"}]
+
+
+# Crash while tasks are running: work time and end of open run segments are recovered from TickJournal tail,
+# before and after compaction of journal
+def checkJournalRecovery(taskCount=20, ticks=30):
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbPath = os.path.join(tmpDir, "check.db")
+        journalPath = os.path.join(tmpDir, "check.journal")
+
+        def openStorage():
+            return cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping, journalPath=journalPath,
+                                   segmentConnector=cPl.DBConnector(dbPath, "TaskSegment", ormMappingSegment))
+
+        for compacted in (False, True):
+            storage = openStorage()
+            storage.addTasks([f"task {i}" for i in range(taskCount)])
+            tasks = [storage.getTaskByNum(row) for row in range(storage.getElementCount())][-taskCount:]
+            paused = tasks[::2]
+            for task in tasks:
+                task.startTask()
+            for task in paused:
+                task.pauseTask()
+            expected = dict((task.taskId, task.closedWorkTime) for task in tasks)
+            segmentStart = dict((task.taskId, task.segmentStart) for task in tasks if task.segmentStart is not None)
+            if compacted:
+                storage.compactJournal()
+            storage.scheduler.stop()  # crash: running tasks are not paused
+            journal = cPl.TickJournal(journalPath)
+            for taskId, start in segmentStart.items():  # ticks of running tasks before crash
+                for tick in range(1, ticks + 1):
+                    journal.append(taskId, start + tick * 10, 10)
+                expected[taskId] += ticks * 10
+            journal.close()
+            with open(journalPath, "ab") as file:  # record cut by crash
+                file.write(b"\x01\x02")
+            recovered = openStorage()
+            recovered.clearFilter()
+            for task in tasks:
+                workTime = recovered.getTaskFromId(task.taskId).workTime
+                if workTime != expected[task.taskId]:
+                    raise AssertionError(f"recovered work time {workTime} != {expected[task.taskId]} "
+                                         f"(compacted={compacted})")
+            segments = cPl.DBConnector(dbPath, "TaskSegment", ormMappingSegment)
+            for taskId, start in segmentStart.items():
+                end = next(segments.iterData(f"TaskId={taskId} AND SegmentStart={start}", ["SegmentEnd"]))[0]
+                if end != start + ticks * 10:
+                    raise AssertionError(f"run segment of task {taskId} ends at {end} (compacted={compacted})")
+            segments.close()
+            if len(cPl.TickJournal(journalPath).read()) != 0:
+                raise AssertionError("journal is not reset after recovery")
+            recovered.close()
+        # task is paused and started again after checkpoint is computed and before it is submitted: work time
+        # written by pause is not lowered by checkpoint
+        storage = openStorage()
+        storage.addTask("stale checkpoint")
+        task = storage.getTaskByNum(storage.getElementCount() - 1)
+        task.startTask()
+        write = storage._TaskStorage__write
+
+        def restartBeforeWrite(taskIds, function, *args):
+            if function.__name__.endswith("__writeCheckpoint"):
+                time.sleep(1.1)
+                task.pauseTask()
+                task.startTask()
+            write(taskIds, function, *args)
+
+        storage._TaskStorage__write = restartBeforeWrite
+        storage.compactJournal()
+        del storage._TaskStorage__write
+        db = cPl.DBConnector(dbPath, "Task", ormMapping)
+        workTime = db.getAggregate(["WorkTime"], f"id={task.taskId}")[0]
+        db.close()
+        storage.close()
+        if workTime != task.closedWorkTime:
+            raise AssertionError(f"checkpoint lowered work time {task.closedWorkTime} to {workTime}")
+        # running tasks deleted one by one and by bulk delete get no checkpoints by compaction
+        storage = openStorage()
+        storage.addTasks([f"deleted {i}" for i in range(4)])
+        tasks = [storage.getTaskByNum(row) for row in range(storage.getElementCount())][-4:]
+        for task in tasks:
+            task.startTask()
+        storage.deleteTask(tasks[0].taskId)
+        storage.deleteTasks([task.taskId for task in tasks[1:3]])
+        storage.compactJournal()
+        checkpoints = [record[0] for record in cPl.TickJournal(journalPath).read()]
+        storage.close()
+        if checkpoints != [tasks[3].taskId]:
+            raise AssertionError(f"compaction wrote checkpoints of tasks {checkpoints}, expected {[tasks[3].taskId]}")
+    return [{"name": "TickJournal crash recovery check", "tasks": taskCount, "ticks": ticks, "result": "ok"}]
+
+
+# Random add/start/pause/stop/delete operations: incrementally maintained filtered rows and work time
+# aggregates must be the same as after full rebuild of the filter
+def checkIncrementalFilter(operations=2000, seed=1, pageSize=None, archive=False, worker=False):
+    if worker:
+        app = QApplication.instance() or QApplication(sys.argv)
+    rnd = random.Random(seed)
+    views = (lambda storage: storage.viewActiveTask(),
+             lambda storage: storage.viewAllFinishedTask(),
+             lambda storage: storage.viewFinishedTaskBetweenDate(0, int(time.time())),
+             lambda storage: storage.clearFilter())
+    with tempfile.TemporaryDirectory() as tmpDir:
+        fillFinishedTasks(os.path.join(tmpDir, "check.db"), 30)  # archived rows at start
+        storage = createStorage(os.path.join(tmpDir, "check.db"), 20, pageSize, archive, worker)
+        colorRules = cPl.ColorRules.fromBindings(cPl.colorBindings).byWorkTime(1800, QBrush(Qt.yellow)).byAge(
+            3600, QBrush(Qt.gray))
+        model = cPl.TaskModel(storage, ormMapping, 0, buttonData, colorRules=colorRules)
+        storage.Model = model
+        shown = [obj for obj in ormMapping if obj.viewMappingType == cPl.ViewMapping.SHOW]
+        view = views[0]
+        for i in range(operations):
+            operation = rnd.randrange(6)
+            count = storage.getElementCount()
+            task = storage.getTaskByNum(rnd.randrange(count)) if count > 0 else None
+            if operation == 0 or task is None:
+                storage.addTask(f"check {i}")
+            elif operation == 1:
+                task.startTask()
+            elif operation == 2:
+                task.pauseTask()
+            elif operation == 3:
+                task.stopTask()
+            elif operation == 4:
+                storage.deleteTask(task.taskId)
+            else:
+                view = views[rnd.randrange(len(views))]
+                view(storage)
+            fetchAll(storage)
+            if storage.unconfirmedWrites != 0:
+                raise AssertionError(f"writes are not confirmed after flush after operation {i}")
+            rows = [storage.getTaskByNum(row) for row in range(storage.getElementCount())]
+            stats = storage.getWorkTimeStats()
+            if stats != workTimeStats(rows) and storage.getWorkTimeStats() != workTimeStats(rows):  # clock moved
+                raise AssertionError(f"work time aggregates differ from full scan after operation {i}")
+            view(storage)  # full rebuild
+            fetchAll(storage)
+            expected = [storage.getTaskByNum(row) for row in range(storage.getElementCount())]
+            if [task.taskId for task in rows] != [task.taskId for task in expected]:  # paged rows are read again
+                raise AssertionError(f"filtered rows differ from full rebuild after operation {i}")
+            for row, task in enumerate(rows):
+                if model.data(model.index(row, 0), Qt.BackgroundRole) != colorRules.brush(task, int(time.time()))[0]:
+                    raise AssertionError(f"cached row brush differs after operation {i}")
+                for column, obj in enumerate(shown):
+                    if obj.objectPropertyName == "workTime" and task.segmentStart is not None:
+                        continue  # running time is shown as of last tick
+                    value = getattr(task, obj.objectPropertyName)
+                    value = obj.formatFunction(value) if obj.formatFunction is not None else value
+                    if model.data(model.index(row, column)) != value:
+                        raise AssertionError(f"cached display value differs after operation {i}")
+        storage.close()
+    return [{"name": "TaskStorage incremental filter check", "operations": operations, "seed": seed,
+             "pageSize": pageSize, "archive": archive, "worker": worker, "result": "ok"}]
+
+
+# Database created before TaskSegment table: every task with work time gets one segment, also finished tasks
+# which are not loaded at start (paged mode, archive table)
+def checkSegmentMigration(taskCount=2000):
+    results = []
+    for pageSize in (None, 200):
+        for archive in (False, True):
+            with tempfile.TemporaryDirectory() as tmpDir:
+                dbPath = os.path.join(tmpDir, "check.db")
+                fillFinishedTasks(dbPath, taskCount)
+                db = cPl.DBConnector(dbPath, "Task", ormMapping)
+                db.addMany(["Name", "DateStart", "State", "WorkTime"],
+                           [[f"active {i}", 1000, "PAUSED", i % 3 * 60] for i in range(30)])
+                expected = db.getAggregate(["COUNT(*)", "SUM(WorkTime)"], "WorkTime > 0")
+                db.close()
+                archiveConnector = cPl.DBConnector(dbPath, "TaskArchive", ormMapping) if archive else None
+                storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping, pageSize=pageSize,
+                                          archiveConnector=archiveConnector,
+                                          segmentConnector=cPl.DBConnector(dbPath, "TaskSegment", ormMappingSegment))
+                storage.close()
+                segments = cPl.DBConnector(dbPath, "TaskSegment", ormMappingSegment)
+                migrated = segments.getAggregate(["COUNT(*)", "SUM(SegmentEnd - SegmentStart)"])
+                segments.close()
+                if tuple(migrated) != tuple(expected):
+                    raise AssertionError(f"migrated segments {tuple(migrated)} != {tuple(expected)} "
+                                         f"(pageSize={pageSize}, archive={archive})")
+                results.append({"name": "TaskStorage segment migration check", "tasks": taskCount + 30,
+                                "pageSize": pageSize, "archive": archive, "result": "ok"})
+    return results
+
+
+# Database with finished tasks in Task table is opened with archive table (same or attached database file):
+# finished tasks are moved, finished views and search give the same rows, stopped and restarted tasks are moved
+def checkArchiveMigration(taskCount=2000, pageSize=100):
+    results = []
+    for attached in (False, True):
+        with tempfile.TemporaryDirectory() as tmpDir:
+            dbPath = os.path.join(tmpDir, "check.db")
+            archivePath = os.path.join(tmpDir, "archive.db") if attached else dbPath
+            fillFinishedTasks(dbPath, taskCount)
+            cPl.DBConnector(dbPath, "Task", ormMapping).addMany(["Name", "DateStart", "State", "WorkTime"],
+                                                                [[f"active {i}", 0, "", 0] for i in range(10)])
+
+            def openStorage(archive):
+                archiveConnector = cPl.DBConnector(archivePath, "TaskArchive", ormMapping, ftsFields=("Name",)) \
+                    if archive else None
+                return cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping, ftsFields=("Name",)), ormMapping,
+                                       pageSize=pageSize, archiveConnector=archiveConnector)
+
+            def finishedRows(storage, view):
+                view(storage)
+                while storage.canFetchMore():
+                    storage.fetchMore()
+                return [storage.getTaskByNum(row).taskId for row in range(storage.getElementCount())], \
+                    storage.getWorkTimeStats()
+
+            views = (lambda storage: storage.viewAllFinishedTask(),
+                     lambda storage: storage.viewFinishedTaskBetweenDate(0, int(time.time())),
+                     lambda storage: storage.viewTasksMatching("archived 12", True),
+                     lambda storage: storage.viewTasksMatching("active", False))
+            single = openStorage(False)
+            expected = [finishedRows(single, view) for view in views]
+            single.close()
+            storage = openStorage(True)
+            if cPl.DBConnector(dbPath, "Task", ormMapping).getCount() != 10 or \
+                    cPl.DBConnector(archivePath, "TaskArchive", ormMapping).getCount() != taskCount:
+                raise AssertionError("finished tasks are not moved to archive table")
+            if [finishedRows(storage, view) for view in views] != expected:
+                raise AssertionError("rows of views differ after migration")
+            storage.viewActiveTask()
+            task = storage.getTaskByNum(0)
+            storage.addTask("new task")
+            storage.viewActiveTask()
+            if storage.getTaskByNum(storage.getElementCount() - 1).taskId != taskCount + 11:
+                raise AssertionError("id of new task is taken from Task table only")
+            task.stopTask()
+            storage.close()
+            storage = openStorage(True)
+            if task.taskId not in finishedRows(storage, views[0])[0]:
+                raise AssertionError("stopped task is not moved to archive table")
+            storage.getTaskFromId(task.taskId).startTask()
+            storage.viewActiveTask()
+            if task.taskId not in [storage.getTaskByNum(row).taskId for row in range(storage.getElementCount())]:
+                raise AssertionError("restarted task is not shown as active")
+            storage.close()
+            storage = openStorage(True)
+            if task.taskId in finishedRows(storage, views[0])[0] or \
+                    cPl.DBConnector(dbPath, "Task", ormMapping).getCount() != 11:
+                raise AssertionError("restarted task is not moved back to Task table")
+            storage.close()
+        results.append({"name": "TaskStorage archive table migration check", "tasks": taskCount,
+                        "attached": attached, "result": "ok"})
+    return results
+
+
+# Rows of bulk operation are written to Task, archive and segment tables (same or attached database file) in one
+# transaction: failed write of one table leaves all tables unchanged. addMany returns ids of not consecutive rows
+def checkBulkTransaction(taskCount=200):
+    results = []
+    for attached in (False, True):
+        with tempfile.TemporaryDirectory() as tmpDir:
+            dbPath = os.path.join(tmpDir, "check.db")
+            otherPath = os.path.join(tmpDir, "other.db") if attached else dbPath
+            db = cPl.DBConnector(dbPath, "Task", ormMapping)
+            ids = db.addMany(["id", "Name", "DateStart", "State", "WorkTime"],
+                             [[taskCount + 100, "last", 0, "", 0], [taskCount + 50, "middle", 0, "", 0]])
+            ids += db.addMany(["Name", "DateStart", "State", "WorkTime"],
+                              [[f"active {i}", 0, "", 0] for i in range(taskCount)])
+            if ids[:3] != [taskCount + 100, taskCount + 50, taskCount + 101] or len(set(ids)) != len(ids) or \
+                    sorted(ids) != sorted(row[0] for row in db.iterData("", ["id"])):
+                raise AssertionError(f"addMany returned wrong ids {ids[:3]}")
+            db.close()
+            segmentConnector = cPl.DBConnector(otherPath, "TaskSegment", ormMappingSegment, indexFields=("TaskId",))
+            storage = cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping), ormMapping,
+                                      archiveConnector=cPl.DBConnector(otherPath, "TaskArchive", ormMapping),
+                                      segmentConnector=segmentConnector)
+            for taskId in ids:
+                storage.getTaskFromId(taskId).startTask()
+
+            def counts():
+                return [cPl.DBConnector(path, table, mapping).getAggregate(["COUNT(*)"], condition)[0]
+                        for path, table, mapping, condition in
+                        ((dbPath, "Task", ormMapping, ""), (otherPath, "TaskArchive", ormMapping, ""),
+                         (otherPath, "TaskSegment", ormMappingSegment, "SegmentEnd IS NULL"))]
+
+            storage.stopTasks(ids[:taskCount // 2])
+            if counts() != [len(ids) - taskCount // 2, taskCount // 2, len(ids) - taskCount // 2]:
+                raise AssertionError(f"stopTasks wrote {counts()} (attached={attached})")
+            for operation in (lambda: storage.stopTasks(ids), lambda: storage.deleteTasks(ids)):
+                before = counts()
+                conn = sqlite3.connect(otherPath)
+                conn.execute("ALTER TABLE TaskSegment RENAME TO TaskSegmentMoved")
+                conn.commit()
+                try:
+                    operation()
+                except sqlite3.OperationalError:
+                    pass
+                else:
+                    raise AssertionError("write of missing segment table did not fail")
+                conn.execute("ALTER TABLE TaskSegmentMoved RENAME TO TaskSegment")
+                conn.commit()
+                conn.close()
+                if counts() != before:
+                    raise AssertionError(f"failed bulk operation changed tables {before} -> {counts()} "
+                                         f"(attached={attached})")
+            storage.close()
+        results.append({"name": "TaskStorage bulk transaction check", "tasks": taskCount + 2, "attached": attached,
+                        "result": "ok"})
+    return results
+
+
+# Crash between commits of Task table and attached archive file leaves a row in both tables: stopped task is
+# moved again and restarted task is removed from archive table at next start, full-text index has no stale rows
+def checkArchiveCrash(taskCount=200):
+    results = []
+    for attached in (False, True):
+        with tempfile.TemporaryDirectory() as tmpDir:
+            dbPath = os.path.join(tmpDir, "check.db")
+            archivePath = os.path.join(tmpDir, "archive.db") if attached else dbPath
+
+            def openStorage():
+                return cPl.TaskStorage(cPl.DBConnector(dbPath, "Task", ormMapping, ftsFields=("Name",)), ormMapping,
+                                       pageSize=50, archiveConnector=cPl.DBConnector(archivePath, "TaskArchive",
+                                                                                     ormMapping, ftsFields=("Name",)))
+
+            fillFinishedTasks(dbPath, taskCount)
+            cPl.DBConnector(dbPath, "Task", ormMapping).addMany(["Name", "DateStart", "State", "WorkTime"],
+                                                                [[f"active {i}", 0, "PAUSED", 0] for i in range(10)])
+            openStorage().close()
+            columns = "id, Name, DateStart, DateEnd, State, WorkTime"
+            conn = sqlite3.connect(dbPath)
+            conn.execute("ATTACH DATABASE ? AS archive", (archivePath,))
+            archiveTable = "archive.TaskArchive" if attached else "TaskArchive"
+            # stopped task 1: row is inserted to archive, delete from Task table is lost
+            conn.execute(f"INSERT INTO Task ({columns}) SELECT {columns} FROM {archiveTable} WHERE id=1")
+            # restarted task 2: row is moved back to Task table, delete from archive is lost
+            conn.execute(f"INSERT INTO Task ({columns}) SELECT id, Name, DateStart, NULL, 'PAUSED', WorkTime "
+                         f"FROM {archiveTable} WHERE id=2")
+            conn.commit()
+            conn.close()
+            storage = openStorage()
+            storage.close()
+            conn = sqlite3.connect(dbPath)
+            conn.execute("ATTACH DATABASE ? AS archive", (archivePath,))
+            active = [row[0] for row in conn.execute("SELECT id FROM Task ORDER BY id")]
+            archived = [row[0] for row in conn.execute(f"SELECT id FROM {archiveTable} ORDER BY id")]
+            fts = "archive.TaskArchive_fts" if attached else "TaskArchive_fts"
+            # raises if full-text index differs from rows of archive table
+            conn.execute(f"INSERT INTO {fts}({fts.split('.')[-1]}, rank) VALUES ('integrity-check', 1)")
+            conn.close()
+            if active != [2] + list(range(taskCount + 1, taskCount + 11)) or \
+                    archived != [1] + list(range(3, taskCount + 1)):
+                raise AssertionError(f"rows after crash recovery: Task {active[:3]}..., archive {archived[:3]}... "
+                                     f"(attached={attached})")
+        results.append({"name": "TaskStorage archive crash recovery check", "tasks": taskCount, "attached": attached,
+                        "result": "ok"})
+    return results
+
+
+# benchmark name -> (full run, quick run)
+suites = {
+    "checkIncrementalFilter": (lambda: checkIncrementalFilter() + checkIncrementalFilter(pageSize=5) +
+                               checkIncrementalFilter(archive=True) + checkIncrementalFilter(pageSize=5, archive=True) +
+                               checkIncrementalFilter(pageSize=5, archive=True, worker=True),
+                               lambda: checkIncrementalFilter(300) + checkIncrementalFilter(300, pageSize=5) +
+                               checkIncrementalFilter(300, archive=True) +
+                               checkIncrementalFilter(300, pageSize=5, archive=True) +
+                               checkIncrementalFilter(300, pageSize=5, archive=True, worker=True)),
+    "checkSegmentMigration": (lambda: checkSegmentMigration(), lambda: checkSegmentMigration(300)),
+    "checkArchiveMigration": (lambda: checkArchiveMigration(), lambda: checkArchiveMigration(300, 50)),
+    "checkArchiveCrash": (lambda: checkArchiveCrash(), lambda: checkArchiveCrash(50)),
+    "checkBulkTransaction": (lambda: checkBulkTransaction(), lambda: checkBulkTransaction(50)),
+    "checkPagedArchive": (lambda: checkPagedArchive(), lambda: checkPagedArchive(500, 50)),
+    "checkJournalRecovery": (lambda: checkJournalRecovery(), lambda: checkJournalRecovery(6, 5)),
+    "benchMemory": (lambda: benchMemory(), lambda: benchMemory(50000)),
+    "benchReports": (lambda: benchReports(), lambda: benchReports(100000, 5)),
+    "benchBulkOperations": (lambda: benchBulkOperations(), lambda: benchBulkOperations(10000, 100)),
+    "benchDBWorker": (lambda: benchDBWorker(), lambda: benchDBWorker(50)),
+    "benchTickJournal": (lambda: benchTickJournal(), lambda: benchTickJournal(100, 2000)),
+    "benchDBConnector": (lambda: benchDBConnector(), lambda: benchDBConnector(100)),
+    "benchNotify": (lambda: benchNotify(), lambda: benchNotify(200, 5)),
+    "benchRefreshCoalescer": (lambda: benchRefreshCoalescer(), lambda: benchRefreshCoalescer((10, 200))),
+    "benchScheduler": (lambda: benchScheduler(), lambda: benchScheduler(200, duration=0.5)),
+    "benchFilters": (lambda: benchFilters(), lambda: benchFilters(10000, 5)),
+    "benchDelegates": (lambda: benchDelegates(), lambda: benchDelegates(200, 20000)),
+    "benchTableView": (lambda: benchTableView(), lambda: benchTableView(2000)),
+    "benchDateRange": (lambda: benchDateRange(), lambda: benchDateRange(50000, 20)),
+    "benchSearch": (lambda: benchSearch(), lambda: benchSearch(50000, 5)),
+    "benchStartup": (lambda: benchStartup(), lambda: benchStartup((10000,))),
+}
+
+
+# tree version of results for comparison between versions
+def gitVersion():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# results with p50 latency grown more than threshold times against baseline report
+def compareReports(report, baseline, threshold=1.2):
+    previous = dict((result["name"], result) for result in baseline["results"] if "p50_us" in result)
+    regressions = []
+    for result in report["results"]:
+        old = previous.get(result["name"])
+        if old is not None and "p50_us" in result and old["p50_us"] > 0 and \
+                result["p50_us"] / old["p50_us"] > threshold:
+            regressions.append({"name": result["name"], "p50_us": result["p50_us"], "baseline_p50_us": old["p50_us"]})
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time Planner benchmarks")
+    parser.add_argument("--quick", action="store_true", help="small synthetic histories")
+    parser.add_argument("--only", default="", help="comma separated benchmark names: " + ", ".join(suites))
+    parser.add_argument("--output", default="", help="JSON file for results (stdout if empty)")
+    parser.add_argument("--baseline", default="", help="JSON results of previous version to compare with")
+    args = parser.parse_args()
+    names = [name for name in args.only.split(",") if name != ""] or list(suites)
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    for name in names:
+        try:
+            results += suites[name][1 if args.quick else 0]()
+        except Exception as error:  # failed benchmark is reported, others are run
+            results.append({"name": name, "error": repr(error)})
+    report = {"version": gitVersion(), "python": sys.version.split()[0], "pyside": PySide2.__version__,
+              "qt": qVersion(), "platform": platform.platform(), "quick": args.quick, "results": results}
+    if args.baseline != "":
+        with open(args.baseline) as baselineFile:
+            report["regressions"] = compareReports(report, json.load(baselineFile))
+    if args.output != "":
+        with open(args.output, "w") as outputFile:
+            json.dump(report, outputFile, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
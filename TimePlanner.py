@@ -2,8 +2,9 @@ import datetime
 import sys
 import time
 from datetime import datetime
-from PySide2.QtCore import QDate, SIGNAL, QObject
+from PySide2.QtCore import QDate, SIGNAL, QObject, QTimer
 from PySide2.QtWidgets import (QTableView, QApplication, QDateEdit, QHeaderView, QCheckBox, QSystemTrayIcon, QStyle)
+from PySide2.QtWidgets import QAbstractItemView, QMessageBox
 from PySide2.QtWidgets import (QWidget, QGridLayout, QPushButton, QLineEdit, QVBoxLayout, QHBoxLayout, QLabel)
 import ClassesPlanner as cPl
 
@@ -60,14 +61,30 @@ ormMappingFinished = (
                     cPl.ViewMapping.SHOW, "Work Time", workTimeFormat)
 )
 
+# Mapping for run segments of tasks (start/pause/stop boundaries)
+ormMappingSegment = (
+    cPl.OrmSettings("id", "segmentId", cPl.FieldType.all, "INTEGER", [cPl.dbTypeField.PKEY, cPl.dbTypeField.NOTNULL]),
+    cPl.OrmSettings("TaskId", "taskId", cPl.FieldType.all, "INTEGER", [cPl.dbTypeField.NONE]),
+    cPl.OrmSettings("SegmentStart", "segmentStart", cPl.FieldType.all, "INTEGER", [cPl.dbTypeField.NONE]),
+    cPl.OrmSettings("SegmentEnd", "segmentEnd", cPl.FieldType.all, "INTEGER", [cPl.dbTypeField.NONE])
+)
+
 def anonFuncString():
     return "Total time"
 
 class MainWin(QWidget):
     def __init__(self):
         super().__init__()
-        self.dbConnector = cPl.DBConnector("timePlanner.db", "Task", ormMapping)
-        self.taskStorage = cPl.TaskStorage(self.dbConnector, ormMapping);
+        self.dbConnector = cPl.DBConnector("timePlanner.db", "Task", ormMapping, ftsFields=("Name",))  # active tasks
+        self.archiveConnector = cPl.DBConnector("timePlanner.db", "TaskArchive", ormMapping, indexFields=("DateEnd",),
+                                                ftsFields=("Name",))  # finished tasks
+        self.segmentConnector = cPl.DBConnector("timePlanner.db", "TaskSegment", ormMappingSegment,
+                                                indexFields=("TaskId",))
+        self.dbWorker = cPl.DBWorker()  # clicks don't wait for commits
+        self.taskStorage = cPl.TaskStorage(self.dbConnector, ormMapping, segmentConnector=self.segmentConnector,
+                                           pageSize=200, dbWorker=self.dbWorker, frameRate=30,
+                                           journalPath="timePlanner.journal", archiveConnector=self.archiveConnector);
+        self.taskStorage.writeErrorHandler = self.showWriteError
         self.currentView = "Work"
         self.checkBox = QCheckBox('Minimize to Tray')
         self.checkBox.setChecked(True)
@@ -87,6 +104,9 @@ class MainWin(QWidget):
 
         self.initUI()
 
+    def showWriteError(self, error):
+        QMessageBox.warning(self, "Database error", f"Changes of task were not saved: {error}")
+
     def hideEvent(self, event):
         if self.checkBox.isChecked():
             event.ignore()
@@ -111,6 +131,11 @@ class MainWin(QWidget):
             self.view.setColumnWidth(self.model.getHeaderLenght()+2, 70)
             self.view.setColumnWidth(self.model.getHeaderLenght()+3, 70)
 
+        elif self.currentView == "Reports":
+            self.view.horizontalHeader().setSectionResizeMode(1, QHeaderView.Fixed)
+            self.view.horizontalHeader().setSectionResizeMode(2, QHeaderView.Fixed)
+            self.view.setColumnWidth(1, 70)
+            self.view.setColumnWidth(2, 140)
         else:
             self.view.horizontalHeader().setSectionResizeMode(1, QHeaderView.Fixed)
             self.view.horizontalHeader().setSectionResizeMode(2, QHeaderView.Fixed)
@@ -140,6 +165,8 @@ class MainWin(QWidget):
 
         self.view = QTableView();
         self.view.setModel(self.model)
+        self.view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.view.setSelectionMode(QAbstractItemView.ExtendedSelection)  # selected rows are finished/deleted together
         stylesheet = "QHeaderView::section{color: grey; border: 2px solid #6c6c6c; border-width: 0px 0px 2px 0px; " \
                      "border-style: dotted; border-color: black} "
         self.view.setStyleSheet(stylesheet)
@@ -184,6 +211,15 @@ class MainWin(QWidget):
         lineEdit.setMinimumWidth(250)
         hBox.addWidget(buttonAdd)
         hBox.addStretch(1)
+        self.searchEdit = QLineEdit('')
+        self.searchEdit.setPlaceholderText("Search tasks")
+        self.searchEdit.setMinimumWidth(250)
+        self.searchTimer = QTimer(self)  # filter is applied when typing pauses
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(150)
+        self.searchTimer.timeout.connect(self.applySearch)
+        self.searchEdit.textChanged.connect(self.searchTimer.start)
+        hBox.addWidget(self.searchEdit)
         vBox.addLayout(hBox)
         topPanel.setLayout(vBox)
         return topPanel
@@ -198,25 +234,46 @@ class MainWin(QWidget):
     def createButtonView(self):
         buttons = []
         datePickers = []
+        reportButtons = []
         buttonPanel = QWidget()
         buttonPanel.setContentsMargins(0, 0, 0, 0)
         buttonCurrent = QPushButton('Current tasks')
         buttonCurrent.setCheckable(True)
         buttonFinished = QPushButton('Finished tasks')
         buttonFinished.setCheckable(True)
+        buttonReports = QPushButton('Reports')
+        buttonReports.setCheckable(True)
         buttonFilter = QPushButton("Filter by end date")
         buttonApply = QPushButton("Apply")
         buttonFilter.setCheckable(True)
         buttonCurrent.setMaximumWidth(100)
         buttonFinished.setMaximumWidth(100)
+        buttonReports.setMaximumWidth(100)
         buttonFilter.setMaximumWidth(100)
         buttonApply.setMaximumWidth(100)
         buttonCurrent.setMinimumWidth(100)
         buttonFinished.setMinimumWidth(100)
+        buttonReports.setMinimumWidth(100)
         buttonFilter.setMinimumWidth(100)
         buttonApply.setMinimumWidth(100)
+        buttonFinishSelected = QPushButton("Finish selected")
+        buttonDeleteSelected = QPushButton("Delete selected")
+        buttonFinishSelected.setMaximumWidth(100)
+        buttonDeleteSelected.setMaximumWidth(100)
+        buttonFinishSelected.setMinimumWidth(100)
+        buttonDeleteSelected.setMinimumWidth(100)
+        buttonFinishSelected.clicked.connect(self.finishSelectedTasks)
+        buttonDeleteSelected.clicked.connect(self.deleteSelectedTasks)
         buttons.append(buttonFilter)
 
+        for text, grouping in (("By day", cPl.ReportGrouping.day), ("By week", cPl.ReportGrouping.week),
+                               ("By month", cPl.ReportGrouping.month), ("By task", cPl.ReportGrouping.taskName)):
+            buttonGrouping = QPushButton(text)
+            buttonGrouping.setMaximumWidth(100)
+            buttonGrouping.setMinimumWidth(100)
+            buttonGrouping.clicked.connect(self.switchReportGrouping(grouping))
+            reportButtons.append(buttonGrouping)
+
         #
         labelStart = QLabel("Date start")
         datePickers.append(labelStart)
@@ -235,8 +292,15 @@ class MainWin(QWidget):
         datePickers.append(dateEnd)
         datePickers.append(buttonApply)
 
-        buttonCurrent.clicked.connect(self.switchCurrentTask(buttonFinished, buttonCurrent, buttons))
-        buttonFinished.clicked.connect(self.switchFinishedTask(buttonCurrent, buttonFinished, buttons))
+        buttonCurrent.clicked.connect(self.switchCurrentTask([buttonFinished, buttonReports], buttonCurrent,
+                                                             buttons + reportButtons,
+                                                             [buttonFinishSelected, buttonDeleteSelected]))
+        buttonFinished.clicked.connect(self.switchFinishedTask([buttonCurrent, buttonReports], buttonFinished,
+                                                               buttons + [buttonDeleteSelected],
+                                                               reportButtons + [buttonFinishSelected]))
+        buttonReports.clicked.connect(self.switchReports([buttonCurrent, buttonFinished], buttonReports,
+                                                         buttons + [buttonFinishSelected, buttonDeleteSelected],
+                                                         reportButtons))
         buttonFilter.clicked.connect(self.openDatePickerFilter(datePickers, buttonFilter))
         buttonApply.clicked.connect(self.ApplyDateFilterArchive(dateStart, dateEnd))
         buttonCurrent.setChecked(True)
@@ -244,8 +308,11 @@ class MainWin(QWidget):
         vBox = QVBoxLayout()
         vBox.addWidget(buttonCurrent)
         vBox.addWidget(buttonFinished)
+        vBox.addWidget(buttonReports)
         vBox.addSpacing(30)
-        for bnt in buttons:
+        vBox.addWidget(buttonFinishSelected)
+        vBox.addWidget(buttonDeleteSelected)
+        for bnt in buttons + reportButtons:
             bnt.setVisible(False)
             vBox.addWidget(bnt)
         for datePicker in datePickers:
@@ -260,17 +327,41 @@ class MainWin(QWidget):
         def call_sql():
             if lineEdit.text() != "":
                 self.taskStorage.addTask(lineEdit.text())
-                self.model.refresh()
 
         return call_sql
 
+    # task ids of selected rows in current view (total row has no task)
+    def selectedTaskIds(self):
+        model = self.view.model()
+        rows = sorted(set(index.row() for index in self.view.selectionModel().selectedRows()))
+        return [taskId for taskId in (model.getClickedTaskId("taskId", row) for row in rows) if taskId is not None]
+
+    def finishSelectedTasks(self):
+        self.taskStorage.stopTasks(self.selectedTaskIds())
+
+    def deleteSelectedTasks(self):
+        taskIds = self.selectedTaskIds()
+        if len(taskIds) > 0:
+            confirm = QMessageBox.question(self, "Delete confimation",
+                                           f"{len(taskIds)} task(s) will be deleted. Are you sure you want to do it?",
+                                           QMessageBox.Yes, QMessageBox.No)
+            if confirm == QMessageBox.Yes:
+                self.taskStorage.deleteTasks(taskIds)
+
+    # tasks of current view with names matching search text, empty text shows all tasks of view
+    def applySearch(self):
+        text = self.searchEdit.text()
+        if self.currentView == "Work":
+            self.model.switchToMatchingData(text, False)
+        elif self.currentView == "Archive":
+            self.finishedModel.switchToMatchingData(text, True)
+
     def openDatePickerFilter(self, filterElements, clickBtn):
         def call():
             if not clickBtn.isChecked():
                 for filterElement in filterElements:
                     filterElement.setVisible(False)
-                    self.taskStorage.viewAllFinishedTask()
-                    self.finishedModel.refresh()
+                    self.finishedModel.switchToAllDataView()
             else:
                 for filterElement in filterElements:
                     filterElement.setVisible(True)
@@ -284,11 +375,10 @@ class MainWin(QWidget):
             startUTC = int(float(start.timestamp()))
             endUTC = int(float(end.timestamp()))
             self.finishedModel.switchToFilterData(startUTC, endUTC)
-            self.finishedModel.refresh()
 
         return call
 
-    def switchCurrentTask(self, buttonInAct, btnAct, btnsFilter):
+    def switchCurrentTask(self, buttonsInAct, btnAct, btnsHide, btnsShow):
         def call():
             if self.currentView != "Work":
                 self.model.setAllTaskView()
@@ -297,32 +387,69 @@ class MainWin(QWidget):
                 self.view.setItemDelegateForColumn(self.model.getHeaderLenght() + 1, self.buttonPause)
                 self.view.setItemDelegateForColumn(self.model.getHeaderLenght() + 2, self.buttonFinish)
                 btnAct.setChecked(True)
-                buttonInAct.setChecked(False)
-                for btn in btnsFilter:
+                for btn in buttonsInAct:
+                    btn.setChecked(False)
+                for btn in btnsHide:
                     btn.setVisible(False)
+                for btn in btnsShow:
+                    btn.setVisible(True)
                 self.currentView = "Work"
                 self.__resizeView()
+                if self.searchEdit.text() != "":
+                    self.applySearch()
 
         return call
 
-    def switchFinishedTask(self, buttonInAct, btnAct, btnsFilter):
+    def switchFinishedTask(self, buttonsInAct, btnAct, btnsFilter, btnsHide):
         def call():
             if self.currentView != "Archive":
                 self.finishedModel.switchToAllDataView()
                 self.view.setModel(self.finishedModel)
                 self.view.setItemDelegateForColumn(self.model.getHeaderLenght(), self.buttonDelete)
                 btnAct.setChecked(True)
-                buttonInAct.setChecked(False)
+                for btn in buttonsInAct:
+                    btn.setChecked(False)
                 for btn in btnsFilter:
                     btn.setVisible(True)
+                for btn in btnsHide:
+                    btn.setVisible(False)
                 self.currentView = "Archive"
                 self.__resizeView()
+                if self.searchEdit.text() != "":
+                    self.applySearch()
+
+        return call
+
+    # report is read from database again on each switch by worker after queued writes,
+    # running tasks are not in report
+    def switchReports(self, buttonsInAct, btnAct, btnsHide, btnsReport):
+        def call():
+            btnAct.setChecked(True)
+            if self.currentView != "Reports":
+                self.reportModel.refresh()
+                self.view.setModel(self.reportModel)
+                for btn in buttonsInAct:
+                    btn.setChecked(False)
+                for btn in btnsHide:
+                    btn.setVisible(False)
+                for btn in btnsReport:
+                    btn.setVisible(True)
+                self.currentView = "Reports"
+                self.__resizeView()
+
+        return call
+
+    def switchReportGrouping(self, grouping):
+        def call():
+            self.reportModel.setGrouping(grouping)
 
         return call
 
     def createModels(self):
         self.model = cPl.TaskModel(self.taskStorage, ormMapping, 0, buttonData, self)  # передаем хранилище задач в модель
         self.finishedModel = cPl.TaskModel(self.taskStorage, ormMappingFinished, 1, buttonDataFinish, self)
+        self.taskReport = cPl.TaskReport(self.archiveConnector, ormMapping, TimeZone, self.dbWorker)
+        self.reportModel = cPl.ReportModel(self.taskReport, workTimeFormat)
 
     def updateView(self):
         self.view.update()
@@ -330,4 +457,5 @@ class MainWin(QWidget):
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     ex = MainWin()
+    app.aboutToQuit.connect(ex.taskStorage.close)
     sys.exit(app.exec_())